@@ -1,12 +1,26 @@
 import logging
+import secrets
 
-from django.contrib import admin
+from django.apps import apps
+from django.conf import settings
+from django.contrib import admin, messages
+from django.contrib.admin.views.main import ORDER_VAR, ChangeList
 from django.contrib.auth.admin import UserAdmin
-from django.contrib.auth.models import Group, Permission
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.core.exceptions import PermissionDenied, ValidationError
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path
 from django.utils.html import format_html
 from django.utils.translation import gettext_lazy as _
 
+from core.exports import csv_response
+from core.forms import NeedsImportForm
+from core.imports import NeedsImport, read_sheet
 from core.models import Goods, Needs, Poi, PoiMembership, Shipments, User
+from core.permissions import has_poi_permissions, only_my_pois
+from core.search import search
 
 logger = logging.getLogger(__name__)
 
@@ -14,22 +28,78 @@ admin.site.site_title = _("Home")
 admin.site.site_header = _("Home")
 
 
-def _has_add_permission(request, codenames) -> bool:
-    try:
-        membership = request.user.member.all()[:]
-        if membership:
-            try:
-                for codename in codenames:
-                    membership[0].group.permissions.get(codename=codename)
-            except Permission.DoesNotExist:
-                return False
-            else:
-                return True
-    except AttributeError:
-        return False
+def _autocomplete_source(request):
+    """(app_label, model_name, field_name) of the form field an admin autocomplete request is for, or None."""
+    if request.resolver_match is None or request.resolver_match.url_name != "autocomplete":
+        return None
+    return request.GET.get("app_label"), request.GET.get("model_name"), request.GET.get("field_name")
+
+
+class AutocompleteChoicesMixin:
+    """
+    Serves autocomplete requests with the choices the source model admin offers
+    in its formfield_for_foreignkey(), so POI scoping applies to the suggestions
+    too, searched in `autocomplete_search_fields` (trigram indexed, see migration 0012).
+    """
 
+    autocomplete_search_fields = None
 
-class BaseModelAdmin(admin.ModelAdmin):
+    def _autocomplete_field(self, request):
+        # Already validated by AutocompleteJsonView.process_request()
+        app_label, model_name, field_name = _autocomplete_source(request)
+        source_model = apps.get_model(app_label, model_name)
+        return self.admin_site._registry[source_model], source_model._meta.get_field(field_name)
+
+    def get_search_fields(self, request):
+        if _autocomplete_source(request) and self.autocomplete_search_fields:
+            return self.autocomplete_search_fields
+        return super().get_search_fields(request)
+
+    def get_search_results(self, request, queryset, search_term):
+        if not _autocomplete_source(request):
+            return super().get_search_results(request, queryset, search_term)
+        source_admin, db_field = self._autocomplete_field(request)
+        choices = source_admin.formfield_for_foreignkey(db_field, request).queryset
+        # Paginated, so the order has to be stable
+        queryset = choices.order_by(*(queryset.query.order_by or ["-pk"]))
+        return super().get_search_results(request, queryset, search_term)
+
+    def has_view_permission(self, request, obj=None) -> bool:
+        if obj is None and _autocomplete_source(request):
+            source_admin, db_field = self._autocomplete_field(request)
+            return source_admin.has_autocomplete_permission(request, db_field)
+        return super().has_view_permission(request, obj)
+
+    def has_autocomplete_permission(self, request, db_field) -> bool:
+        # Whoever may fill the field may search its choices
+        return self.has_add_permission(request) or self.has_change_permission(request)
+
+
+class CsvExportMixin:
+    """Adds an export/ view streaming the changelist queryset (POI scoped by get_queryset()) as CSV."""
+
+    # (field path, column label) pairs
+    export_fields = []
+
+    def get_urls(self):
+        info = self.model._meta.app_label, self.model._meta.model_name
+        return [
+            path("export/", self.admin_site.admin_view(self.export_view), name="%s_%s_export" % info),
+        ] + super().get_urls()
+
+    def export_view(self, request):
+        if not self.has_view_or_change_permission(request):
+            raise PermissionDenied
+        return csv_response(
+            request,
+            self.model._meta.model_name,
+            [str(label) for _field, label in self.export_fields],
+            self.get_queryset(request).order_by("pk"),
+            [field for field, _label in self.export_fields],
+        )
+
+
+class BaseModelAdmin(AutocompleteChoicesMixin, admin.ModelAdmin):
     readonly_fields = [
         "created_at",
         "updated_at",
@@ -63,25 +133,34 @@ class BaseModelAdmin(admin.ModelAdmin):
             return True
 
     def _only_my_pois(self, user, perms):
-        pois = []
-        if user.is_anonymous:
-            return pois
+        return only_my_pois(user, perms)
+
+
+class RankedChangeList(ChangeList):
+    def get_ordering(self, request, queryset):
+        # Best matches first, unless the user sorts by a column
+        if self.query.strip() and ORDER_VAR not in self.params:
+            return ["-search_rank", "-pk"]
+        return super().get_ordering(request, queryset)
+
 
-        if user.is_superuser:
-            pois.extend([poi.id for poi in Poi.objects.all()])
-            return pois
+class FullTextSearchMixin:
+    """Searches `search_vector`, a path to Goods.search_vector, with results ranked by relevance."""
 
-        memberships = PoiMembership.objects.filter(member=user, is_active=True).all()
-        for membership in memberships:
-            for perm in membership.group.permissions.all():
-                if perm.codename in perms:
-                    logging.info("User %s allowed to %s for %s", user, perm, membership.poi)
-                    pois.append(membership.poi.id)
-        return pois
+    search_vector = None
+
+    def get_changelist(self, request, **kwargs):
+        return RankedChangeList
+
+    def get_search_results(self, request, queryset, search_term):
+        # Autocomplete needs substring matches of what has been typed so far
+        if not search_term.strip() or _autocomplete_source(request):
+            return super().get_search_results(request, queryset, search_term)
+        return search(queryset, search_term.strip(), self.search_vector, self.search_fields), False
 
 
 @admin.register(Goods)
-class GoodsAdmin(BaseModelAdmin):
+class GoodsAdmin(FullTextSearchMixin, BaseModelAdmin):
     fields = [
         "name",
         "description",
@@ -93,6 +172,8 @@ class GoodsAdmin(BaseModelAdmin):
         "name",
         "description",
     ]
+    search_vector = "search_vector"
+    autocomplete_search_fields = ["name"]
 
     def formfield_for_foreignkey(self, db_field, request, **kwargs):
         # Dropdown shows only POIs in which user has active membership
@@ -118,7 +199,7 @@ class GoodsAdmin(BaseModelAdmin):
 
 
 @admin.register(Needs)
-class NeedsAdmin(BaseModelAdmin):
+class NeedsAdmin(FullTextSearchMixin, CsvExportMixin, BaseModelAdmin):
     fields = [
         "good",
         "quantity",
@@ -143,6 +224,22 @@ class NeedsAdmin(BaseModelAdmin):
     ]
 
     search_fields = ["good__name", "good__description"]
+    search_vector = "good__search_vector"
+    autocomplete_search_fields = ["good__name"]
+    autocomplete_fields = ["good"]
+
+    export_fields = [
+        ("id", _("ID")),
+        ("poi__name", _("Needs.poi")),
+        ("good__name", _("Needs.good")),
+        ("quantity", _("Needs.quantity")),
+        ("unit", _("Needs.unit")),
+        ("due_time", _("Needs.due_time")),
+        ("status", _("Needs.status")),
+        ("created_by__username", _("BaseModel.created_by")),
+        ("created_at", _("BaseModel.created_at")),
+        ("updated_at", _("BaseModel.updated_at")),
+    ]
 
     @admin.display(description=_("Share on Facebook"))
     def share_on_facebook(self, obj):
@@ -153,10 +250,13 @@ class NeedsAdmin(BaseModelAdmin):
 
     def formfield_for_foreignkey(self, db_field, request, **kwargs):
         # Dropdown shows only POIs in which user has active membership
-        # with high enough permissions to add needs
+        # with high enough permissions to add needs, and only their goods
         if db_field.name == "poi":
             pois = self._only_my_pois(request.user, ["add_needs"])
             kwargs["queryset"] = Poi.objects.filter(id__in=pois)
+        if db_field.name == "good":
+            pois = self._only_my_pois(request.user, ["add_needs"])
+            kwargs["queryset"] = Goods.objects.filter(poi_id__in=pois)
         return super().formfield_for_foreignkey(db_field, request, **kwargs)
 
     def has_add_permission(self, request) -> bool:
@@ -166,6 +266,82 @@ class NeedsAdmin(BaseModelAdmin):
             pois = self._only_my_pois(request.user, ["add_needs"])
             return bool(pois)
 
+    def get_urls(self):
+        return [
+            path("import/", self.admin_site.admin_view(self.import_view), name="core_needs_import"),
+        ] + super().get_urls()
+
+    def import_view(self, request):
+        pois = self._only_my_pois(request.user, ["add_needs"])
+        if not pois:
+            raise PermissionDenied
+
+        form = NeedsImportForm(pois=pois)
+        needs_import = token = None
+        if request.method == "POST" and "token" in request.POST:
+            # Confirmation of a dry run, the file kept from it is validated again
+            upload = cache.get(f"core:needs-import:{request.POST['token']}")
+            if upload is None or upload["user"] != request.user.pk:
+                self.message_user(request, _("The import has expired, upload the file again"), messages.ERROR)
+                return redirect("admin:core_needs_import")
+            try:
+                poi = Poi.objects.get(pk=upload["poi"])
+            except Poi.DoesNotExist:
+                # Deleted since the dry run, the form asks for another POI and the file again
+                form = NeedsImportForm({"dry_run": True}, pois=pois)
+                form.errors["poi"] = form.error_class([_("The POI has been deleted, choose another one")])
+            else:
+                needs_import = NeedsImport(request.user, poi, read_sheet(upload["name"], upload["content"]))
+            if needs_import is not None and needs_import.is_valid:
+                cache.delete(f"core:needs-import:{request.POST['token']}")
+                return self._imported(request, needs_import.save())
+        elif request.method == "POST":
+            form = NeedsImportForm(request.POST, request.FILES, pois=pois)
+            if form.is_valid():
+                upload = form.cleaned_data["file"]
+                content = upload.read()
+                try:
+                    rows = read_sheet(upload.name, content)
+                except ValidationError as e:
+                    form.add_error("file", e)
+                else:
+                    needs_import = NeedsImport(request.user, form.cleaned_data["poi"], rows)
+                    if needs_import.is_valid and not form.cleaned_data["dry_run"]:
+                        return self._imported(request, needs_import.save())
+                    if needs_import.is_valid:
+                        token = secrets.token_urlsafe()
+                        cache.set(
+                            f"core:needs-import:{token}",
+                            {
+                                "user": request.user.pk,
+                                "poi": needs_import.poi.pk,
+                                "name": upload.name,
+                                "content": content,
+                            },
+                            timeout=60 * 60,
+                        )
+
+        context = {
+            **self.admin_site.each_context(request),
+            "title": _("Import needs"),
+            "opts": self.model._meta,
+            "form": form,
+            "needs_import": needs_import,
+            "preview_rows": self._preview_rows(needs_import) if needs_import else [],
+            "token": token,
+        }
+        return TemplateResponse(request, "admin/core/needs/import.html", context)
+
+    def _preview_rows(self, needs_import):
+        # Every invalid row, so all of them can be fixed, then the first valid ones
+        invalid = [row for row in needs_import.rows if row.errors]
+        valid = [row for row in needs_import.rows if not row.errors]
+        return invalid + valid[: settings.IMPORT_PREVIEW_ROWS]
+
+    def _imported(self, request, count):
+        self.message_user(request, _("Imported %(count)d needs") % {"count": count}, messages.SUCCESS)
+        return redirect("admin:core_needs_changelist")
+
     def get_queryset(self, request):
         # User should see only Membership in POI in which is admin or user
         logging.debug("User %s requesting needs list in admin", request.user)
@@ -197,14 +373,21 @@ class PoiAdmin(BaseModelAdmin):
         # "organization",
     ] + BaseModelAdmin.fields
 
-    search_fields = ["good__name", "good__description"]
+    list_display = [
+        "name",
+        "active_needs",
+    ]
+
+    search_fields = ["name", "description"]
 
 
 @admin.register(User)
-class CustomUserAdmin(UserAdmin):
+class CustomUserAdmin(AutocompleteChoicesMixin, UserAdmin):
     search_fields = [
         "description",
     ]
+    autocomplete_search_fields = ["username", "first_name", "last_name", "email"]
+    list_display = UserAdmin.list_display + ("open_shipments",)
 
 
 @admin.register(PoiMembership)
@@ -223,6 +406,8 @@ class PoiMembershipAdmin(BaseModelAdmin):
         "is_active",
     ]
 
+    autocomplete_fields = ["member"]
+
     def formfield_for_foreignkey(self, db_field, request, **kwargs):
         # Dropdown shows only POIs in which user has active membership
         # with high enough permissions to add needs
@@ -247,6 +432,12 @@ class PoiMembershipAdmin(BaseModelAdmin):
             pois = self._only_my_pois(request.user, ["view_poimembership"])
             return bool(pois)
 
+    def has_autocomplete_permission(self, request, db_field) -> bool:
+        # has_change_permission() allows everyone without an object, users are listed to POI admins only
+        if self.has_add_permission(request) or super(BaseModelAdmin, self).has_change_permission(request):
+            return True
+        return bool(self._only_my_pois(request.user, ["change_poimembership"]))
+
     def has_change_permission(self, request, obj=None) -> bool:
         # No, you cannot change membership even it was created by you,
         # hence we call super on BaseModelAdmin, not on PoiMembershipAdmin
@@ -277,7 +468,7 @@ class PoiMembershipAdmin(BaseModelAdmin):
 
 
 @admin.register(Shipments)
-class ShipmentsAdmin(BaseModelAdmin):
+class ShipmentsAdmin(CsvExportMixin, BaseModelAdmin):
     fields = [
         "need",
         "status",
@@ -294,6 +485,20 @@ class ShipmentsAdmin(BaseModelAdmin):
         "updated_at",
     ]
 
+    autocomplete_fields = ["need"]
+
+    export_fields = [
+        ("id", _("ID")),
+        ("need__poi__name", _("Poi.name")),
+        ("need__good__name", _("Goods.name")),
+        ("need__quantity", _("Needs.quantity")),
+        ("need__unit", _("Needs.unit")),
+        ("status", _("Shipments.status")),
+        ("created_by__username", _("BaseModel.created_by")),
+        ("created_at", _("BaseModel.created_at")),
+        ("updated_at", _("BaseModel.updated_at")),
+    ]
+
     @admin.display(description=_("Goods.name"))
     def need_name(self, obj):
         return obj.need.good.name
@@ -312,17 +517,21 @@ class ShipmentsAdmin(BaseModelAdmin):
         if not form.base_fields:
             return form
 
-        form.base_fields["need"].queryset = Needs.objects.filter(status=Needs.Status.ACTIVE)
         if obj is None:
             form.base_fields["created_by"].initial = request.user.pk
         form.base_fields["created_by"].disabled = True
         return form
 
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if db_field.name == "need":
+            kwargs["queryset"] = Needs.objects.filter(status=Needs.Status.ACTIVE).select_related("good")
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
     def has_add_permission(self, request) -> bool:
         if super().has_add_permission(request):
             return True
         else:
-            return _has_add_permission(request, ["add_shipments"])
+            return has_poi_permissions(request.user, ["add_shipments"])
 
     def has_change_permission(self, request, obj=None) -> bool:
         # No, you cannot change shipment even it was created by you,
@@ -336,12 +545,5 @@ class ShipmentsAdmin(BaseModelAdmin):
         # User should see only Shipments to POI in which is admin or user
         logging.debug("User %s requesting list of shipments in admin", request.user)
         qs = super().get_queryset(request)
-        memberships = PoiMembership.objects.filter(member=request.user, is_active=True).all()
-        pois = []
-        for membership in memberships:
-            for perm in membership.group.permissions.all():
-                if perm.codename == "view_shipments":
-                    logging.info("User %s allowed to view shipments for %s", request.user, membership.poi)
-                    pois.append(membership.poi.id)
-
+        pois = self._only_my_pois(request.user, ["view_shipments"])
         return qs.filter(need__poi_id__in=pois)
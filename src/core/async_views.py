@@ -0,0 +1,93 @@
+"""
+Async variants of the public read views, routed instead of the sync ones when ASYNC_PUBLIC_VIEWS is set (see sfn.asgi).
+
+Django 4.0 has no async ORM yet, so database access and template rendering
+run in a bounded thread pool of ASYNC_VIEW_WORKERS threads and Pillow renders
+in a separate pool of IMG_RENDER_WORKERS threads. A burst of share image
+requests can then occupy only the render pool while the event loop keeps
+serving everything else.
+"""
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import HttpResponse
+from django.template.response import SimpleTemplateResponse
+from django.utils.cache import get_conditional_response
+
+from core import views
+from core.img import text_digest
+from sfn import databases, timing
+
+_pools = {}
+
+
+def _pool(name: str, workers: int) -> ThreadPoolExecutor:
+    if name not in _pools:
+        _pools[name] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"sfn-{name}")
+    return _pools[name]
+
+
+def _closing_connections(func, *args, **kwargs):
+    # Persistent connections of pool threads are never checked by request_started
+    databases.check_connections()
+    try:
+        with timing.record_queries():
+            return func(*args, **kwargs)
+    finally:
+        # The request_finished signal closes connections of the handler thread only,
+        # pool threads honour CONN_MAX_AGE themselves
+        close_old_connections()
+
+
+async def run_in_pool(name: str, workers: int, func, *args, **kwargs):
+    # Context is copied, so e.g. sfn.timing keeps measuring the work done in the pool
+    context = contextvars.copy_context()
+    call = functools.partial(context.run, _closing_connections, func, *args, **kwargs)
+    return await asyncio.get_running_loop().run_in_executor(_pool(name, workers), call)
+
+
+async def run_sync(func, *args, **kwargs):
+    return await run_in_pool("views", settings.ASYNC_VIEW_WORKERS, func, *args, **kwargs)
+
+
+async def run_render(func, *args, **kwargs):
+    return await run_in_pool("img", settings.IMG_RENDER_WORKERS, func, *args, **kwargs)
+
+
+async def need_endpoint(request):
+    # Claims write and must keep the transaction and locking of the sync path
+    return await run_sync(views.need_endpoint, request)
+
+
+_poi_view = views.PoiView.as_view()
+_need_view = views.NeedView.as_view()
+
+
+def _rendered(response):
+    # Cached pages and 304s come back rendered already
+    return response.render() if isinstance(response, SimpleTemplateResponse) else response
+
+
+async def poi_view(request, pk: int):
+    response = await run_sync(_poi_view, request, pk=pk)
+    # The lazy template response has to be rendered in the pool as well
+    return await run_sync(_rendered, response)
+
+
+async def need_view(request, pk: int):
+    response = await run_sync(_need_view, request, pk=pk)
+    return await run_sync(_rendered, response)
+
+
+async def poi_needs_fb_sharer_img(request, pk: int):
+    text = await run_sync(views.poi_needs_img_text, pk)
+    etag = f'"{text_digest(text)}"'
+
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(await run_render(views.timed_render_png, text), headers={"Content-Type": "image/png"})
+    return views.patch_img_response(response, etag)
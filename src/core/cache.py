@@ -0,0 +1,34 @@
+import time
+
+from django.core.cache import cache
+
+NEEDS_VERSION_KEY = "core:needs:version"
+POI_PERMISSIONS_VERSION_KEY = "core:poi-permissions:version"
+
+
+def _version(key: str) -> int:
+    return cache.get_or_set(key, time.time_ns, timeout=None)
+
+
+def _bump(key: str) -> None:
+    # A fresh timestamp instead of incr(): no read-modify-write race between
+    # workers and no chance of reusing an old version after the key got evicted.
+    cache.set(key, time.time_ns(), timeout=None)
+
+
+def needs_version() -> int:
+    """Version of everything rendered from needs, goods, POIs and shipments, part of every fragment cache key."""
+    return _version(NEEDS_VERSION_KEY)
+
+
+def bump_needs_version() -> None:
+    _bump(NEEDS_VERSION_KEY)
+
+
+def poi_permissions_version() -> int:
+    """Version of all cached POI permission maps, see core.permissions."""
+    return _version(POI_PERMISSIONS_VERSION_KEY)
+
+
+def bump_poi_permissions_version() -> None:
+    _bump(POI_PERMISSIONS_VERSION_KEY)
@@ -0,0 +1,113 @@
+"""
+Denormalized counters: Poi.active_needs and User.open_shipments.
+
+They are adjusted with F() expressions next to every status change: save()
+and delete() through signals (core.signals), bulk changes through
+update_status(). manage.py repair_counters recomputes them from the rows.
+"""
+from typing import NamedTuple, Tuple, Type
+
+from django.db import models, transaction
+from django.db.models import Count, F, OuterRef, QuerySet, Subquery
+from django.db.models.functions import Coalesce
+
+from core.models import Needs, Poi, Shipments, User
+
+OPEN_SHIPMENT_STATUSES = (Shipments.Status.TO_DO, Shipments.Status.IN_PROGRESS)
+REPAIR_BATCH_SIZE = 1000
+
+
+class Counter(NamedTuple):
+    owner_model: Type[models.Model]
+    field: str
+    # Field of the counted rows pointing to the owner
+    owner_field: str
+    statuses: Tuple[str, ...]
+
+    def add(self, owner_id: int, delta: int) -> None:
+        if delta:
+            self.owner_model.objects.filter(pk=owner_id).update(**{self.field: F(self.field) + delta})
+
+
+COUNTERS = {
+    Needs: Counter(Poi, "active_needs", "poi_id", (Needs.Status.ACTIVE,)),
+    Shipments: Counter(User, "open_shipments", "created_by_id", OPEN_SHIPMENT_STATUSES),
+}
+
+
+def add_active_needs(poi_id: int, delta: int) -> None:
+    COUNTERS[Needs].add(poi_id, delta)
+
+
+def add_open_shipments(user_id: int, delta: int) -> None:
+    COUNTERS[Shipments].add(user_id, delta)
+
+
+def counted_owner(instance):
+    """Id of the owner whose counter includes `instance` (a need or shipment), None if it is not counted."""
+    counter = COUNTERS[type(instance)]
+    return getattr(instance, counter.owner_field) if instance.status in counter.statuses else None
+
+
+def stored_counted_owner(instance):
+    """counted_owner() of `instance` as stored in the database, None for a new instance."""
+    if instance.pk is None:
+        return None
+    counter = COUNTERS[type(instance)]
+    return (
+        type(instance)
+        .objects.filter(pk=instance.pk, status__in=counter.statuses)
+        .values_list(counter.owner_field, flat=True)
+        .first()
+    )
+
+
+def _count_by_owner(counter: Counter, queryset: QuerySet):
+    return dict(queryset.values_list(counter.owner_field).annotate(count=Count("pk")).order_by())
+
+
+def update_status(queryset: QuerySet, status: str, **fields) -> int:
+    """
+    queryset.update(status=status, **fields) of needs or shipments, with the
+    counters of their owners adjusted in the same transaction.
+    """
+    counter = COUNTERS[queryset.model]
+    with transaction.atomic():
+        # Both read before the update, which may take rows out of the queryset
+        before = _count_by_owner(counter, queryset.filter(status__in=counter.statuses))
+        after = _count_by_owner(counter, queryset) if status in counter.statuses else {}
+        updated = queryset.update(status=status, **fields)
+        for owner_id in before.keys() | after.keys():
+            counter.add(owner_id, after.get(owner_id, 0) - before.get(owner_id, 0))
+    return updated
+
+
+def _actual_count(model, counter: Counter):
+    """Expression counting the rows of `model` counted for the owner in the outer query."""
+    counted = (
+        model.objects.filter(**{counter.owner_field: OuterRef("pk"), "status__in": counter.statuses})
+        .order_by()
+        .values(counter.owner_field)
+        .annotate(count=Count("pk"))
+        .values("count")
+    )
+    return Coalesce(Subquery(counted), 0)
+
+
+def repair() -> int:
+    """Recomputes the counters that are wrong and returns how many there were."""
+    repaired = 0
+    for model, counter in COUNTERS.items():
+        owners = counter.owner_model.objects
+        wrong = list(
+            owners.annotate(actual=_actual_count(model, counter))
+            .exclude(**{counter.field: F("actual")})
+            .values_list("pk", flat=True)
+        )
+        # Counted again in the UPDATE, so changes since the query above are not lost
+        for start in range(0, len(wrong), REPAIR_BATCH_SIZE):
+            end = start + REPAIR_BATCH_SIZE
+            batch = wrong[start:end]
+            owners.filter(pk__in=batch).update(**{counter.field: _actual_count(model, counter)})
+        repaired += len(wrong)
+    return repaired
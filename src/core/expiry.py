@@ -0,0 +1,102 @@
+"""
+Expiry of needs past their due_time.
+
+Overdue active needs are disabled in batches of NEEDS_EXPIRY_BATCH_SIZE, each
+in one transaction of bulk UPDATEs: the needs, then the open shipments of
+those needs, which are closed as done so they stop counting against the
+volunteer's SHIPMENTS_IN_PROGRESS_LIMIT. Rows of a batch are locked with SKIP
+LOCKED, so several processes may expire at the same time.
+
+Run it with manage.py expire_needs from cron, or set NEEDS_EXPIRY_INTERVAL to
+run it in a thread of every web process.
+"""
+import logging
+import threading
+from typing import NamedTuple, Optional, Set
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+
+from core import counters, feed, prerender, totals
+from core.cache import bump_needs_version
+from core.models import Needs, Shipments
+
+logger = logging.getLogger(__name__)
+
+_scheduler: Optional[threading.Thread] = None
+
+
+class Expired(NamedTuple):
+    needs: int
+    shipments: int
+
+
+def _expire_batch(now, batch_size: int, poi_ids: Set[int]) -> Expired:
+    with transaction.atomic():
+        batch = list(
+            Needs.objects.select_for_update(skip_locked=True)
+            .filter(status=Needs.Status.ACTIVE, due_time__lt=now)
+            .values_list("pk", "poi_id")[:batch_size]
+        )
+        if not batch:
+            return Expired(0, 0)
+        ids = [pk for pk, _ in batch]
+        needs = counters.update_status(
+            Needs.objects.filter(pk__in=ids, status=Needs.Status.ACTIVE), Needs.Status.DISABLED, updated_at=now
+        )
+        shipments = counters.update_status(
+            Shipments.objects.filter(need_id__in=ids, status__in=counters.OPEN_SHIPMENT_STATUSES),
+            Shipments.Status.DONE,
+            updated_at=now,
+        )
+        feed.publish_removed("removed", ids)
+    poi_ids.update(poi_id for _, poi_id in batch)
+    return Expired(needs, shipments)
+
+
+def expire(batch_size: int = None) -> Expired:
+    """Disables active needs past their due_time and returns how many needs and shipments changed."""
+    batch_size = batch_size or settings.NEEDS_EXPIRY_BATCH_SIZE
+    now = timezone.now()
+    poi_ids: Set[int] = set()
+    needs = shipments = 0
+    while True:
+        expired = _expire_batch(now, batch_size, poi_ids)
+        needs += expired.needs
+        shipments += expired.shipments
+        if expired.needs < batch_size:
+            break
+
+    # Once for all batches, UPDATE sends no signals
+    if poi_ids:
+        bump_needs_version()
+        totals.refresh(poi_ids)
+        for poi_id in poi_ids:
+            prerender.schedule(poi_id)
+    return Expired(needs, shipments)
+
+
+def _run_scheduler(interval: int) -> None:
+    event = threading.Event()
+    while not event.wait(interval):
+        try:
+            expired = expire()
+            if expired.needs:
+                logger.info("Expired %s needs and %s shipments", expired.needs, expired.shipments)
+        except Exception:
+            logger.exception("Expiry of needs failed")
+        finally:
+            # Not a request thread, nothing else closes its connections
+            connections.close_all()
+
+
+def start_scheduler() -> None:
+    """Expires needs every NEEDS_EXPIRY_INTERVAL seconds in a thread of this process, if set."""
+    global _scheduler
+    if not settings.NEEDS_EXPIRY_INTERVAL or _scheduler is not None:
+        return
+    _scheduler = threading.Thread(
+        target=_run_scheduler, args=(settings.NEEDS_EXPIRY_INTERVAL,), name="sfn-needs-expiry", daemon=True
+    )
+    _scheduler.start()
@@ -0,0 +1,214 @@
+"""
+Live feed of active needs as Server-Sent Events, served by sfn.asgi when NEEDS_FEED is set.
+
+Every change of the active needs is published once, when its transaction
+commits: on Postgres with NOTIFY, which reaches the feed of every process
+through one LISTEN connection per process, elsewhere straight to the feed of
+the current process. Each process fans the events out to its connected
+browsers from memory, nobody polls the database per client.
+
+Events are JSON objects with an "event" key:
+- "created" (the need entered the active set) and "changed" carry a need as in need_event(),
+- "claimed" and "removed" carry the "ids" of needs that left the active set,
+- "reload" means the list changed too much to describe, e.g. after an import.
+A client that fell behind or lost the connection may have missed events and
+should treat it like "reload".
+"""
+import asyncio
+import json
+import logging
+import select
+import threading
+import time
+from typing import Iterable, Optional, Set
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections, transaction
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "core_needs_feed"
+# NOTIFY payloads are limited to 8000 bytes
+NAME_MAX_LENGTH = 500
+IDS_PER_EVENT = 500
+RECONNECT_DELAY = 5
+
+
+def need_event(event: str, need) -> dict:
+    return {
+        "event": event,
+        "id": need.pk,
+        "good": need.good.name[:NAME_MAX_LENGTH],
+        "quantity": need.get_quantity_display(),
+        "unit": need.unit,
+        "created_at": need.created_at,
+        "poi": {"id": need.poi_id, "name": need.poi.name[:NAME_MAX_LENGTH], "url": need.poi.get_absolute_url()},
+        "url": need.get_absolute_url(),
+    }
+
+
+def publish(event: dict, using: str = "default") -> None:
+    """Sends `event` to the connected browsers of all processes once the current transaction commits."""
+    if not settings.NEEDS_FEED:
+        return
+    payload = json.dumps(event, cls=DjangoJSONEncoder)
+    connection = connections[using]
+    if connection.vendor == "postgresql":
+        # Delivered by Postgres on commit, to the listener of every process including this one
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_notify(%s, %s)", [CHANNEL, payload])
+    else:
+        transaction.on_commit(lambda: broker.dispatch(payload), using=using)
+
+
+def publish_removed(event: str, ids: Iterable[int], using: str = "default") -> None:
+    ids = list(ids)
+    for start in range(0, len(ids), IDS_PER_EVENT):
+        end = start + IDS_PER_EVENT
+        publish({"event": event, "ids": ids[start:end]}, using)
+
+
+class Subscription:
+    """Events of one connected browser, read in the event loop that subscribed."""
+
+    def __init__(self):
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(settings.NEEDS_FEED_QUEUE_SIZE)
+        # Set when events were dropped because the client reads too slowly
+        self.overflowed = False
+
+    def _put(self, payload: str) -> None:
+        if self.overflowed:
+            return
+        if self.queue.full():
+            self.overflowed = True
+            # Makes room for a marker waking up the reader, the queued events are useless now
+            self.queue.get_nowait()
+        self.queue.put_nowait(payload)
+
+    async def get(self) -> Optional[str]:
+        """The next event, None once the subscription overflowed."""
+        payload = await self.queue.get()
+        return None if self.overflowed else payload
+
+
+class Broker:
+    """Fans events out to the subscriptions of this process, from any thread."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions: Set[Subscription] = set()
+        self._listener: Optional[threading.Thread] = None
+
+    def __len__(self):
+        return len(self._subscriptions)
+
+    def subscribe(self) -> Optional[Subscription]:
+        """A new subscription, None when the process already serves NEEDS_FEED_MAX_CLIENTS."""
+        subscription = Subscription()
+        with self._lock:
+            if len(self._subscriptions) >= settings.NEEDS_FEED_MAX_CLIENTS:
+                return None
+            self._subscriptions.add(subscription)
+            if self._listener is None and connections["default"].vendor == "postgresql":
+                self._listener = threading.Thread(target=self._listen, name="sfn-needs-feed", daemon=True)
+                self._listener.start()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def dispatch(self, payload: str) -> None:
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription._put, payload)
+            except RuntimeError:  # the loop is closed
+                self.unsubscribe(subscription)
+
+    def _listen(self) -> None:
+        connection = connections["default"]
+        while True:
+            try:
+                connection.ensure_connection()
+                with connection.cursor() as cursor:
+                    cursor.execute(f"LISTEN {CHANNEL}")
+                raw = connection.connection
+                while True:
+                    if select.select([raw], [], [], settings.NEEDS_FEED_KEEPALIVE) != ([], [], []):
+                        raw.poll()
+                        while raw.notifies:
+                            self.dispatch(raw.notifies.pop(0).payload)
+            except Exception:
+                logger.exception("Listening for needs feed events failed, reconnecting")
+                connection.close()
+                # Events sent meanwhile are lost
+                self.dispatch(json.dumps({"event": "reload"}))
+                time.sleep(RECONNECT_DELAY)
+
+
+broker = Broker()
+
+
+async def _wait_for_disconnect(receive) -> None:
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+async def _send(send, body: bytes) -> None:
+    await send({"type": "http.response.body", "body": body, "more_body": True})
+
+
+async def app(scope, receive, send):
+    """ASGI application streaming the feed to one browser."""
+    if scope["method"] != "GET":
+        await send({"type": "http.response.start", "status": 405, "headers": [(b"allow", b"GET")]})
+        await send({"type": "http.response.body", "body": b""})
+        return
+    subscription = broker.subscribe()
+    if subscription is None:
+        # EventSource gives up, the page works on without live updates
+        await send({"type": "http.response.start", "status": 503, "headers": [(b"retry-after", b"30")]})
+        await send({"type": "http.response.body", "body": b""})
+        return
+
+    disconnect = asyncio.ensure_future(_wait_for_disconnect(receive))
+    try:
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [
+                    (b"content-type", b"text/event-stream"),
+                    (b"cache-control", b"no-cache"),
+                    # Stops nginx from buffering the stream
+                    (b"x-accel-buffering", b"no"),
+                ],
+            }
+        )
+        await _send(send, f"retry: {settings.NEEDS_FEED_RETRY * 1000}\n\n".encode())
+        while True:
+            event = asyncio.ensure_future(subscription.get())
+            done, _ = await asyncio.wait(
+                {event, disconnect}, timeout=settings.NEEDS_FEED_KEEPALIVE, return_when=asyncio.FIRST_COMPLETED
+            )
+            if disconnect in done:
+                event.cancel()
+                return
+            if event not in done:
+                event.cancel()
+                # Keeps proxies from closing an idle connection
+                await _send(send, b": keepalive\n\n")
+                continue
+            payload = event.result()
+            if payload is None:
+                await _send(send, b'data: {"event": "reload"}\n\n')
+                break
+            await _send(send, f"data: {payload}\n\n".encode())
+        await send({"type": "http.response.body", "body": b""})
+    finally:
+        broker.unsubscribe(subscription)
+        disconnect.cancel()
@@ -0,0 +1,33 @@
+from django import forms
+from django.conf import settings
+from django.template.defaultfilters import filesizeformat
+from django.utils.translation import gettext_lazy as _
+
+from core.models import Poi
+
+
+class NeedsImportForm(forms.Form):
+    poi = forms.ModelChoiceField(queryset=Poi.objects.none(), label=_("Needs.poi"))
+    file = forms.FileField(
+        label=_("File"),
+        help_text=_("CSV or XLSX with the columns good, quantity, unit, due_time and optionally description"),
+    )
+    dry_run = forms.BooleanField(
+        label=_("Dry run"),
+        help_text=_("Only check the file and show what would be imported"),
+        initial=True,
+        required=False,
+    )
+
+    def __init__(self, *args, pois=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields["poi"].queryset = Poi.objects.filter(id__in=pois)
+
+    def clean_file(self):
+        file = self.cleaned_data["file"]
+        # The file is kept in the cache until a dry run is confirmed
+        if file.size > settings.IMPORT_MAX_SIZE:
+            raise forms.ValidationError(
+                _("The file is larger than %(size)s") % {"size": filesizeformat(settings.IMPORT_MAX_SIZE)}
+            )
+        return file
@@ -1,11 +1,23 @@
-import textwrap
-from string import ascii_letters
-from typing import Tuple
+import hashlib
+import io
+from functools import lru_cache
+from typing import List, Tuple
 
 from django.conf import settings
+from django.core.cache import caches
 from PIL import Image, ImageDraw, ImageFont
 
 
+@lru_cache(maxsize=None)
+def _load_font(path: str, size: int) -> ImageFont.FreeTypeFont:
+    return ImageFont.truetype(path, size=size)
+
+
+@lru_cache(maxsize=16384)
+def _text_width(path: str, size: int, text: str) -> float:
+    return _load_font(path, size).getlength(text)
+
+
 class FbSharerImg:
     width = 1200
     height = 650
@@ -13,65 +25,92 @@ class FbSharerImg:
     max_font_size = 48
     min_font_size = 8
     vertical_spacing = 12
-
-    def _get_font(self, size: int) -> ImageFont:
-        return ImageFont.truetype(self.font, size=size)
-
-    def _avg_char_size(self, size: int) -> Tuple[float, float]:
-        font = self._get_font(size)
-
-        # Calculate the average length of a single character of our font.
-        # Note: this takes into account the specific font and font size.
-        avg_char_width = sum(font.getsize(char)[0] for char in ascii_letters) / len(ascii_letters)
-        avg_char_height = sum(font.getsize(char)[1] + self.vertical_spacing for char in ascii_letters) / len(
-            ascii_letters
-        )
-
-        return avg_char_width, avg_char_height
-
-    def _wrap_text(self, text: str, max_char_count: int) -> str:
-        wrapped_lines = []
+    margin = 10
+    indent = "  "
+
+    def _get_font(self, size: int) -> ImageFont.FreeTypeFont:
+        return _load_font(self.font, size)
+
+    def _line_height(self, size: int) -> int:
+        # Same line pitch ImageDraw.multiline_text uses for the given spacing
+        return self._get_font(size).getbbox("A")[3] + self.vertical_spacing
+
+    def _wrap_line(self, line: str, size: int, max_width: float) -> List[str]:
+        space_width = _text_width(self.font, size, " ")
+        indent_width = _text_width(self.font, size, self.indent)
+        lines, current, current_width = [], "", 0.0
+        for word in line.split():
+            word_width = _text_width(self.font, size, word)
+            if current and current_width + space_width + word_width > max_width:
+                lines.append(current)
+                current, current_width = self.indent + word, indent_width + word_width
+            elif current:
+                current, current_width = f"{current} {word}", current_width + space_width + word_width
+            else:
+                current, current_width = word, word_width
+        lines.append(current)
+        return lines
+
+    def _layout(self, text: str, size: int) -> Tuple[List[str], bool]:
+        """Wraps `text` into lines of `size` font and tells whether they fit into the image."""
+        max_width = self.width * 0.95 - self.margin
+        lines = []
         for line in text.splitlines():
-            # Create a wrapped text object using scaled character count
-            wrapped_lines.append(textwrap.fill(text=line, width=max_char_count, subsequent_indent="  "))
-        return "\n".join(wrapped_lines)
-
-    def _will_it_fit(self, text: str, size: int, img_width: int, img_height: int) -> bool:
-        avg_char_width, avg_char_height = self._avg_char_size(size)
+            lines.extend(self._wrap_line(line, size, max_width))
 
-        # Translate this average length into a character count
-        # to fill 95% of our image's total width
-        max_char_count = int((img_width * 0.95) / avg_char_width)
-        max_rows_count = int((img_height * 0.95) / avg_char_height)
-
-        wrapped_text = self._wrap_text(text, max_char_count)
+        fits = len(lines) * self._line_height(size) <= self.height * 0.95 and all(
+            _text_width(self.font, size, line) <= max_width for line in lines
+        )
+        return lines, fits
 
-        return len(wrapped_text.splitlines()) <= max_rows_count
+    def create(self, text: str) -> Image:
+        # Binary search of the largest font size which fits, min_font_size is used when nothing does
+        low, high = self.min_font_size, self.max_font_size
+        size, lines = low, None
+        while low <= high:
+            middle = (low + high) // 2
+            middle_lines, fits = self._layout(text, middle)
+            if fits:
+                size, lines = middle, middle_lines
+                low = middle + 1
+            else:
+                high = middle - 1
+        if lines is None:
+            lines, _ = self._layout(text, size)
 
-    def _fit_it(self, text: str, size: int) -> Image:
         img = Image.new(mode="RGB", size=(self.width, self.height), color=(255, 255, 255))
-        font = self._get_font(size)
-        avg_char_width, avg_char_height = self._avg_char_size(size)
-
-        # Translate this average length into a character count
-        # to fill 95% of our image's total width
-        max_char_count = int((img.size[0] * 0.95) / avg_char_width)
-
-        wrapped_text = self._wrap_text(text, max_char_count)
         draw = ImageDraw.Draw(im=img)
-        draw.text(xy=(10, 0), text=wrapped_text, font=font, fill="#000000")
+        draw.multiline_text(
+            xy=(self.margin, 0),
+            text="\n".join(lines),
+            font=self._get_font(size),
+            fill="#000000",
+            spacing=self.vertical_spacing,
+        )
         return img
 
-    def create(self, text: str) -> Image:
-        size = self.max_font_size
-        while size > self.min_font_size:
-            if not self._will_it_fit(text, size, self.width, self.height):
-                size -= 1
-                continue
-            else:
-                break
 
-        return self._fit_it(text, size)
+def text_digest(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def render_png(text: str) -> bytes:
+    """
+    Returns PNG for `text`, rendered at most once per distinct text.
+
+    The image is addressed by the hash of its text in the shared "images" cache,
+    so all workers reuse the same render.
+    """
+    cache = caches["images"]
+    key = f"fb-sharer-img:{text_digest(text)}"
+    png = cache.get(key)
+    if png is None:
+        img = FbSharerImg().create(text)
+        buffer = io.BytesIO()
+        img.save(buffer, "PNG")
+        png = buffer.getvalue()
+        cache.set(key, png)
+    return png
 
 
 if __name__ == "__main__":
@@ -0,0 +1,233 @@
+"""
+Bulk import of needs of one POI from a CSV or XLSX sheet.
+
+The sheet has a header row with the columns `good`, `quantity`, `unit` and
+`due_time`, and optionally `description` (used for goods created by the import).
+Goods are matched to the POI's goods by normalized name and created when
+missing. Nothing is saved unless every row is valid.
+"""
+import csv
+import datetime
+import io
+from decimal import Decimal, InvalidOperation
+from typing import Dict, Iterator, List, NamedTuple, Optional
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.translation import gettext as _
+
+from core import counters, feed, prerender, totals
+from core.cache import bump_needs_version
+from core.models import Goods, Needs, Poi, normalize_name
+from core.permissions import only_my_pois
+
+COLUMNS = ("good", "quantity", "unit", "due_time", "description")
+REQUIRED_COLUMNS = ("good", "quantity", "unit", "due_time")
+# Needs.quantity has 10 digits, 2 of them after the decimal point
+MAX_QUANTITY = Decimal("99999999.99")
+
+
+class ImportRow(NamedTuple):
+    line: int
+    name: str
+    quantity: Optional[Decimal]
+    unit: str
+    due_time: Optional[datetime.datetime]
+    description: str
+    good_id: Optional[int]
+    errors: List[str]
+
+
+def _read_csv(content: bytes) -> Iterator[List[str]]:
+    try:
+        text = content.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise ValidationError(_("The file is not UTF-8 encoded"))
+    try:
+        dialect = csv.Sniffer().sniff(text[:4096], delimiters=",;\t")
+    except csv.Error:
+        dialect = csv.excel
+    return csv.reader(io.StringIO(text), dialect)
+
+
+def _read_xlsx(content: bytes) -> Iterator[List[str]]:
+    try:
+        import openpyxl
+    except ImportError:
+        raise ValidationError(_("XLSX files cannot be imported on this server, save the sheet as CSV"))
+    try:
+        workbook = openpyxl.load_workbook(io.BytesIO(content), read_only=True, data_only=True)
+    except Exception:
+        raise ValidationError(_("The file is not a valid XLSX file"))
+    sheet = workbook.worksheets[0]
+    # Dates stay dates, everything else is parsed like text of a CSV cell
+    return (
+        [cell if isinstance(cell, datetime.datetime) else "" if cell is None else str(cell) for cell in row]
+        for row in sheet.iter_rows(values_only=True)
+    )
+
+
+def read_sheet(name: str, content: bytes) -> List[Dict[str, object]]:
+    """Rows of the sheet as dicts keyed by COLUMNS, with the sheet line number under "line"."""
+    lines = _read_xlsx(content) if name.lower().endswith(".xlsx") else _read_csv(content)
+    first = next(lines, None)
+    if first is None:
+        raise ValidationError(_("The file is empty"))
+
+    header = [str(column).strip().lower() for column in first]
+    missing = [column for column in REQUIRED_COLUMNS if column not in header]
+    if missing:
+        raise ValidationError(_("Missing columns: %(columns)s") % {"columns": ", ".join(missing)})
+    indexes = {column: header.index(column) for column in COLUMNS if column in header}
+
+    rows = []
+    for line, values in enumerate(lines, start=2):
+        if not any(str(value).strip() for value in values):
+            continue
+        if len(rows) == settings.IMPORT_MAX_ROWS:
+            # Rejected without reading the rest of the sheet
+            raise ValidationError(
+                _("At most %(count)d rows can be imported at once") % {"count": settings.IMPORT_MAX_ROWS}
+            )
+        row = {column: values[index] if index < len(values) else "" for column, index in indexes.items()}
+        row["line"] = line
+        rows.append(row)
+    return rows
+
+
+def _parse_quantity(value: str, errors: List[str]) -> Optional[Decimal]:
+    try:
+        quantity = Decimal(str(value).strip().replace(",", "."))
+    except InvalidOperation:
+        errors.append(_("Invalid quantity"))
+        return None
+    if not quantity.is_finite() or not 0 < quantity <= MAX_QUANTITY:
+        errors.append(_("Invalid quantity"))
+        return None
+    return quantity.quantize(Decimal("0.01"))
+
+
+def _parse_due_time(value, errors: List[str]) -> Optional[datetime.datetime]:
+    if isinstance(value, datetime.datetime):
+        due_time = value
+    else:
+        value = str(value).strip()
+        try:
+            due_time = parse_datetime(value)
+            if due_time is None and parse_date(value) is not None:
+                # A date alone means the end of that day
+                due_time = datetime.datetime.combine(parse_date(value), datetime.time(23, 59))
+        except ValueError:
+            due_time = None
+    if due_time is None:
+        errors.append(_("Invalid due time, use YYYY-MM-DD or YYYY-MM-DD HH:MM"))
+        return None
+    if timezone.is_naive(due_time):
+        due_time = timezone.make_aware(due_time)
+    return due_time
+
+
+class NeedsImport:
+    """Validates rows read by read_sheet() for `poi` on behalf of `user` and saves them."""
+
+    def __init__(self, user, poi: Poi, rows: List[Dict[str, object]]):
+        self.user = user
+        self.poi = poi
+        self.errors: List[str] = []
+        if poi.pk not in only_my_pois(user, ["add_needs"]):
+            self.errors.append(_("You cannot add needs in this POI"))
+        can_add_goods = poi.pk in only_my_pois(user, ["add_goods"])
+
+        goods = self._goods_by_name()
+        units = {unit.lower(): unit for unit in Needs.Units.values}
+        units.update({str(label).lower(): unit for unit, label in Needs.Units.choices})
+
+        self.rows: List[ImportRow] = []
+        for row in rows:
+            errors = []
+            name = " ".join(str(row["good"]).split())
+            if not name:
+                errors.append(_("Missing good"))
+            good_id = goods.get(normalize_name(name))
+            if name and good_id is None and not can_add_goods:
+                errors.append(_("Unknown good, you cannot add goods in this POI"))
+            unit = units.get(str(row["unit"]).strip().lower())
+            if unit is None:
+                errors.append(_("Invalid unit, use one of: %(units)s") % {"units": ", ".join(Needs.Units.values)})
+            self.rows.append(
+                ImportRow(
+                    line=row["line"],
+                    name=name,
+                    quantity=_parse_quantity(row["quantity"], errors),
+                    unit=unit or "",
+                    due_time=_parse_due_time(row["due_time"], errors),
+                    description=str(row.get("description", "")).strip(),
+                    good_id=good_id,
+                    errors=errors,
+                )
+            )
+
+    def _goods_by_name(self) -> Dict[str, int]:
+        # The oldest good wins if the POI already has duplicates
+        goods = {}
+        for pk, name in Goods.objects.filter(poi=self.poi).order_by("-id").values_list("id", "name"):
+            goods[normalize_name(name)] = pk
+        return goods
+
+    @property
+    def is_valid(self) -> bool:
+        return not self.errors and not any(row.errors for row in self.rows)
+
+    @property
+    def new_goods(self) -> List[str]:
+        """Names of goods the import creates, once per normalized name."""
+        names = {}
+        for row in self.rows:
+            if row.good_id is None and row.name:
+                names.setdefault(normalize_name(row.name), row.name)
+        return list(names.values())
+
+    def save(self) -> int:
+        """Creates the goods and needs in one transaction and returns the number of needs."""
+        if not self.is_valid:
+            raise ValidationError(_("The import has errors"))
+        batch_size = settings.IMPORT_BATCH_SIZE
+        descriptions = {normalize_name(row.name): row.description for row in reversed(self.rows)}
+        with transaction.atomic():
+            Goods.objects.bulk_create(
+                [
+                    Goods(
+                        name=name,
+                        description=descriptions[normalize_name(name)],
+                        poi=self.poi,
+                        created_by=self.user,
+                    )
+                    for name in self.new_goods
+                ],
+                batch_size=batch_size,
+            )
+            goods = self._goods_by_name()
+            Needs.objects.bulk_create(
+                [
+                    Needs(
+                        good_id=goods[normalize_name(row.name)],
+                        quantity=row.quantity,
+                        unit=row.unit,
+                        due_time=row.due_time,
+                        poi=self.poi,
+                        created_by=self.user,
+                    )
+                    for row in self.rows
+                ],
+                batch_size=batch_size,
+            )
+            # bulk_create() sends no post_save
+            counters.add_active_needs(self.poi.pk, len(self.rows))
+            transaction.on_commit(bump_needs_version)
+            prerender.schedule_on_commit(self.poi.pk)
+            totals.refresh_on_commit(self.poi.pk)
+            feed.publish({"event": "reload"})
+        return len(self.rows)
@@ -0,0 +1,214 @@
+import datetime
+import json
+import platform
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import (
+    override_settings,
+    setup_databases,
+    setup_test_environment,
+    teardown_databases,
+    teardown_test_environment,
+)
+from django.utils import timezone
+
+from core import counters, totals
+from core.cache import bump_needs_version
+from core.models import Goods, Needs, Poi, Shipments, User
+
+POIS = 50
+GOODS_PER_POI = 10
+SHIPMENTS = 200
+BATCH_SIZE = 5000
+
+
+def percentile(samples, pct):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, round(pct / 100 * (len(samples) - 1)))]
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class Command(BaseCommand):
+    help = (
+        "Times the public views, the share image and the admin changelists at several numbers of needs and "
+        "writes latency percentiles and query counts as JSON. Runs on a throwaway test database "
+        "created next to the configured one (SQLite or Postgres)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 100000], help="Numbers of needs")
+        parser.add_argument("--repeat", type=int, default=50, help="Timed requests per view and size")
+        parser.add_argument("--output", default=None, help="Result file, benchmark-<timestamp>.json by default")
+        parser.add_argument("--no-cache", action="store_true", help="Run with dummy cache backends")
+        parser.add_argument("--keepdb", action="store_true", help="Keep the test database between runs")
+
+    def handle(self, *args, **options):
+        db = settings.DATABASES["default"]
+        if db["ENGINE"] != "django.db.backends.sqlite3" and not db.get("NAME"):
+            # The production config points to a libpq service, the test database needs a name of its own
+            db.setdefault("TEST", {}).setdefault("NAME", "test_sfn_benchmark")
+        # Data migrations of core expect permissions created by post_migrate, build the schema from models
+        db.setdefault("TEST", {})["MIGRATE"] = False
+
+        # Private caches, so the benchmark neither serves nor overwrites fragments of the real site
+        backend = "dummy.DummyCache" if options["no_cache"] else "locmem.LocMemCache"
+        caches = {
+            alias: {"BACKEND": f"django.core.cache.backends.{backend}", "LOCATION": f"benchmark-{alias}"}
+            for alias in settings.CACHES
+        }
+
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False, keepdb=options["keepdb"])
+        try:
+            # Pre-rendering processes would not see the private caches, repeated requests would be rate limited
+            with override_settings(CACHES=caches, FB_SHARER_IMG_PRERENDER_WORKERS=0, RATE_LIMITS={}):
+                results = self.run_benchmarks(options)
+        finally:
+            teardown_databases(old_config, verbosity=0, keepdb=options["keepdb"])
+            teardown_test_environment()
+
+        output = options["output"] or f"benchmark-{timezone.now():%Y%m%d-%H%M%S}.json"
+        with open(output, "w") as f:
+            json.dump(
+                {
+                    "created_at": timezone.now().isoformat(),
+                    "database": connection.vendor,
+                    "python": platform.python_version(),
+                    "repeat": options["repeat"],
+                    "cache": not options["no_cache"],
+                    "results": results,
+                },
+                f,
+                indent=2,
+            )
+        self.stdout.write(self.style.SUCCESS(f"Results written to {output}"))
+
+    def run_benchmarks(self, options):
+        results = []
+        for size in sorted(options["sizes"]):
+            self.seed(size)
+            # bulk_create() sends no signals
+            counters.repair()
+            totals.refresh()
+            bump_needs_version()
+            for name, user, url in self.scenarios():
+                client = Client()
+                if user:
+                    client.force_login(user)
+                result = {"size": size, "view": name, "url": url, **self.measure(client, url, options["repeat"])}
+                results.append(result)
+                self.stdout.write(
+                    f"{size:>8} {name:<24} "
+                    + (
+                        f"p50 {result['p50_ms']:8.2f}ms  p90 {result['p90_ms']:8.2f}ms  "
+                        f"p99 {result['p99_ms']:8.2f}ms  queries {result['queries']:g} (cold {result['cold_queries']})"
+                        if "error" not in result
+                        else self.style.ERROR(result["error"])
+                    )
+                )
+        return results
+
+    def measure(self, client, url, repeat):
+        queries = QueryCounter()
+        # The first request warms caches and connections, it is reported separately
+        try:
+            with connection.execute_wrapper(queries):
+                response = client.get(url)
+            if response.status_code != 200:
+                return {"error": f"HTTP {response.status_code}"}
+        except Exception as e:  # e.g. a missing font for the share image
+            return {"error": f"{type(e).__name__}: {e}"}
+        cold_queries, queries.count = queries.count, 0
+
+        samples = []
+        with connection.execute_wrapper(queries):
+            for _ in range(repeat):
+                start = time.perf_counter()
+                client.get(url)
+                samples.append((time.perf_counter() - start) * 1000)
+        return {
+            "p50_ms": percentile(samples, 50),
+            "p90_ms": percentile(samples, 90),
+            "p99_ms": percentile(samples, 99),
+            "mean_ms": statistics.mean(samples),
+            "max_ms": max(samples),
+            "queries": queries.count / repeat,
+            "cold_queries": cold_queries,
+        }
+
+    def scenarios(self):
+        volunteer = User.objects.get(username="benchmark-volunteer")
+        admin = User.objects.get(username="benchmark-admin")
+        poi = Poi.objects.order_by("id").first()
+        need = Needs.objects.filter(status=Needs.Status.ACTIVE).order_by("id").first()
+        return [
+            ("need_endpoint", None, "/"),
+            ("need_endpoint (user)", volunteer, "/"),
+            ("PoiView", None, poi.get_absolute_url()),
+            ("NeedView", None, need.get_absolute_url()),
+            ("MyShipmentsView", volunteer, "/moje-dostawy/"),
+            ("needs_totals", None, "/podsumowanie/"),
+            ("poi_needs_fb_sharer_img", None, f"/poi/{poi.pk}/potrzeby/img"),
+            ("NeedsAdmin changelist", admin, "/admin/core/needs/"),
+            ("ShipmentsAdmin changelist", admin, "/admin/core/shipments/"),
+        ]
+
+    def seed(self, size):
+        """Grows the dataset to `size` needs, so consecutive sizes reuse earlier rows."""
+        if not User.objects.filter(username="benchmark-admin").exists():
+            admin = User.objects.create(username="benchmark-admin", is_staff=True, is_superuser=True)
+            User.objects.create(username="benchmark-volunteer", is_staff=True)
+            pois = Poi.objects.bulk_create(
+                [Poi(name=f"POI {i}", description="", contact="", created_by=admin) for i in range(POIS)]
+            )
+            Goods.objects.bulk_create(
+                [Goods(name=f"Good {i}", poi=poi, created_by=admin) for poi in pois for i in range(GOODS_PER_POI)]
+            )
+
+        admin = User.objects.get(username="benchmark-admin")
+        goods = list(Goods.objects.all())
+        due_time = timezone.now() + datetime.timedelta(days=7)
+        statuses = [Needs.Status.ACTIVE] * 8 + [Needs.Status.DISABLED, Needs.Status.FULFILLED]
+        existing = Needs.objects.count()
+        for start in range(existing, size, BATCH_SIZE):
+            Needs.objects.bulk_create(
+                [
+                    Needs(
+                        good=goods[i % len(goods)],
+                        poi_id=goods[i % len(goods)].poi_id,
+                        quantity=i % 100 + 1,
+                        unit=Needs.Units.PCS,
+                        due_time=due_time,
+                        status=statuses[i % len(statuses)],
+                        created_by=admin,
+                    )
+                    for i in range(start, min(size, start + BATCH_SIZE))
+                ]
+            )
+
+        volunteer = User.objects.get(username="benchmark-volunteer")
+        if not Shipments.objects.exists():
+            needs = Needs.objects.filter(status=Needs.Status.DISABLED)[:SHIPMENTS]
+            Shipments.objects.bulk_create(
+                [
+                    Shipments(
+                        need=need,
+                        status=Shipments.Status.DONE if i % 2 else Shipments.Status.IN_PROGRESS,
+                        created_by=volunteer,
+                    )
+                    for i, need in enumerate(needs)
+                ]
+            )
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from core.expiry import expire
+
+
+class Command(BaseCommand):
+    help = "Disables active needs past their due time and closes their open shipments. Meant to run from cron."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, help="Needs disabled in one transaction")
+
+    def handle(self, *args, **options):
+        expired = expire(options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Expired {expired.needs} needs and closed {expired.shipments} shipments"))
@@ -0,0 +1,63 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from core.models import Needs, Poi, Shipments, User
+
+# Markers of an index access in EXPLAIN output of Postgres and SQLite
+INDEX_MARKERS = ("Index Scan", "Index Only Scan", "USING INDEX", "USING COVERING INDEX")
+
+
+class Command(BaseCommand):
+    help = "Runs EXPLAIN on the hot queries of the site and reports whether they use an index"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--strict",
+            action="store_true",
+            help="Exit with an error if any hot query does not use an index",
+        )
+        parser.add_argument(
+            "--no-seqscan",
+            action="store_true",
+            help="Discourage sequential scans (Postgres only), small dev databases are otherwise always scanned",
+        )
+        parser.add_argument("--verbose-plan", action="store_true", help="Print the whole plan of every query")
+
+    def hot_queries(self):
+        poi_id = Poi.objects.values_list("id", flat=True).first() or 0
+        user_id = User.objects.values_list("id", flat=True).first() or 0
+        return {
+            "needs feed": Needs.objects.filter(status=Needs.Status.ACTIVE).order_by("-created_at", "-id")[
+                : settings.NEEDS_PAGE_SIZE + 1
+            ],
+            "needs of POI": Needs.objects.filter(poi_id=poi_id, status=Needs.Status.ACTIVE),
+            "open shipments of user": Shipments.objects.filter(
+                created_by_id=user_id,
+                status__in=(Shipments.Status.TO_DO, Shipments.Status.IN_PROGRESS),
+            ),
+            "overdue needs": Needs.objects.filter(status=Needs.Status.ACTIVE, due_time__lt=timezone.now()).values_list(
+                "pk", "poi_id"
+            )[: settings.NEEDS_EXPIRY_BATCH_SIZE],
+        }
+
+    def handle(self, *args, **options):
+        missing = []
+        with transaction.atomic():
+            if options["no_seqscan"] and connection.vendor == "postgresql":
+                with connection.cursor() as cursor:
+                    cursor.execute("SET LOCAL enable_seqscan = off")
+
+            for name, qs in self.hot_queries().items():
+                plan = qs.explain()
+                if any(marker in plan for marker in INDEX_MARKERS):
+                    self.stdout.write(self.style.SUCCESS(f"[index] {name}"))
+                else:
+                    missing.append(name)
+                    self.stdout.write(self.style.WARNING(f"[scan]  {name}"))
+                if options["verbose_plan"] or name in missing:
+                    self.stdout.write(plan)
+
+        if missing and options["strict"]:
+            raise CommandError(f"Hot queries without an index: {', '.join(missing)}")
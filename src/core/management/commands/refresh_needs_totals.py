@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from core.totals import refresh
+
+
+class Command(BaseCommand):
+    help = (
+        "Recomputes the totals of active needs per good and unit of every POI, "
+        "e.g. from cron after changing needs directly in the database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--poi", type=int, nargs="*", help="Only these POIs")
+
+    def handle(self, *args, **options):
+        count = refresh(options["poi"])
+        self.stdout.write(self.style.SUCCESS(f"Refreshed totals of {count} POIs"))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from core.counters import repair
+
+
+class Command(BaseCommand):
+    help = (
+        "Recomputes the counters of active needs per POI and open shipments per user from the rows, "
+        "e.g. after changing statuses directly in the database."
+    )
+
+    def handle(self, *args, **options):
+        repaired = repair()
+        if repaired:
+            self.stdout.write(self.style.WARNING(f"Repaired {repaired} counters"))
+        else:
+            self.stdout.write(self.style.SUCCESS("All counters are correct"))
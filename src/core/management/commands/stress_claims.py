@@ -0,0 +1,111 @@
+import datetime
+import threading
+import uuid
+from collections import Counter
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.utils import timezone
+
+from core.counters import update_status
+from core.models import Goods, Needs, Poi, Shipments, User
+from core.services import claim_need
+
+
+class Command(BaseCommand):
+    help = (
+        "Claims needs from many threads at once against the configured database and checks that "
+        "every need is claimed once and no user exceeds SHIPMENTS_IN_PROGRESS_LIMIT. "
+        "Creates its own users, POI and needs and removes them afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=16)
+        parser.add_argument("--rounds", type=int, default=20, help="Number of needs raced for by all threads")
+
+    def _race(self, threads, target):
+        barrier = threading.Barrier(threads)
+        results = Counter()
+        lock = threading.Lock()
+
+        def worker(i):
+            barrier.wait()
+            try:
+                target(i)
+                outcome = "claimed"
+            except ValidationError:
+                outcome = "rejected"
+            except Exception as e:  # e.g. "database is locked" on SQLite
+                outcome = type(e).__name__
+            finally:
+                connection.close()
+            with lock:
+                results[outcome] += 1
+
+        workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+        return results
+
+    def handle(self, *args, **options):
+        threads, rounds = options["threads"], options["rounds"]
+        limit = settings.SHIPMENTS_IN_PROGRESS_LIMIT
+        tag = uuid.uuid4().hex[:8]
+        users = [User.objects.create(username=f"stress-{tag}-{i}") for i in range(threads)]
+        poi = Poi.objects.create(name=f"stress-{tag}", created_by=users[0])
+        good = Goods.objects.create(name=f"stress-{tag}", poi=poi, created_by=users[0])
+
+        def make_needs(count):
+            return [
+                Needs.objects.create(
+                    good=good,
+                    poi=poi,
+                    quantity=1,
+                    unit=Needs.Units.PCS,
+                    due_time=timezone.now() + datetime.timedelta(days=1),
+                    created_by=users[0],
+                )
+                for _ in range(count)
+            ]
+
+        failures, errors = [], Counter()
+        try:
+            # Every thread is a different volunteer clicking the same need
+            for need in make_needs(rounds):
+                results = self._race(threads, lambda i: claim_need(users[i], need.pk))
+                shipments = Shipments.objects.filter(need=need).count()
+                if results["claimed"] > 1 or shipments != results["claimed"]:
+                    failures.append(f"need {need.pk}: {dict(results)}, {shipments} shipments")
+                errors.update({k: v for k, v in results.items() if k not in ("claimed", "rejected")})
+
+            # Every thread is the same volunteer clicking a different need
+            update_status(Shipments.objects.filter(created_by=users[0]), Shipments.Status.DONE)
+            needs = make_needs(limit + threads)
+            for start in range(0, len(needs), threads):
+                end = start + threads
+                batch = needs[start:end]
+                results = self._race(len(batch), lambda i: claim_need(users[0], batch[i].pk))
+                errors.update({k: v for k, v in results.items() if k not in ("claimed", "rejected")})
+            in_progress = Shipments.objects.filter(created_by=users[0], status=Shipments.Status.IN_PROGRESS).count()
+            if in_progress > limit:
+                failures.append(f"user has {in_progress} shipments in progress, limit is {limit}")
+            counted = User.objects.values_list("open_shipments", flat=True).get(pk=users[0].pk)
+            if counted != in_progress:
+                failures.append(f"user has {in_progress} shipments in progress, but open_shipments is {counted}")
+        finally:
+            Shipments.objects.filter(need__poi=poi).delete()
+            Needs.objects.filter(poi=poi).delete()
+            good.delete()
+            poi.delete()
+            User.objects.filter(pk__in=[u.pk for u in users]).delete()
+            connections.close_all()
+
+        if errors:
+            self.stdout.write(self.style.WARNING(f"Claims failed with database errors: {dict(errors)}"))
+        if failures:
+            raise CommandError("\n".join(failures))
+        self.stdout.write(self.style.SUCCESS(f"{rounds} needs raced by {threads} threads, limit of {limit} held"))
@@ -0,0 +1,30 @@
+import os
+from concurrent.futures import as_completed
+
+from django.core.management.base import BaseCommand
+
+from core.img import render_png
+from core.models import Poi
+from core.prerender import create_executor, poi_needs_text
+
+
+class Command(BaseCommand):
+    help = (
+        "Renders the share images of all POIs into the images cache in parallel processes, "
+        "e.g. after a deploy or after clearing the cache. Images already in the cache are not rendered again."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers", type=int, default=os.cpu_count(), help="Render processes, one per CPU by default"
+        )
+
+    def handle(self, *args, **options):
+        texts = [poi_needs_text(poi) for poi in Poi.objects.order_by("id")]
+        failed = 0
+        with create_executor(options["workers"]) as executor:
+            for future in as_completed([executor.submit(render_png, text) for text in texts]):
+                if future.exception() is not None:
+                    failed += 1
+                    self.stderr.write(self.style.ERROR(f"{type(future.exception()).__name__}: {future.exception()}"))
+        self.stdout.write(self.style.SUCCESS(f"Rendered {len(texts) - failed} of {len(texts)} share images"))
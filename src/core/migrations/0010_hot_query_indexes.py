@@ -0,0 +1,27 @@
+# Generated by Django 4.0.3 on 2026-10-18 15:45
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('core', '0009_auto_20220320_1854'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='needs',
+            index=models.Index(condition=models.Q(('status', 'active')), fields=['-created_at', '-id'], name='needs_active_feed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='needs',
+            index=models.Index(fields=['poi', 'status'], name='needs_poi_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shipments',
+            index=models.Index(fields=['created_by', 'status'], name='shipments_user_status_idx'),
+        ),
+    ]
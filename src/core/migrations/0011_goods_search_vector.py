@@ -0,0 +1,68 @@
+from django.contrib.postgres.search import SearchVectorField
+from django.db import migrations
+
+# Configurations missing in the database are replaced by "simple", the list is
+# resolved on every call so installing a dictionary later needs no migration.
+CREATE_SQL = """
+CREATE OR REPLACE FUNCTION core_search_configs() RETURNS regconfig[] LANGUAGE sql STABLE AS $$
+    SELECT array_agg(DISTINCT coalesce(
+        (SELECT c.oid::regconfig FROM pg_ts_config c WHERE c.cfgname = l.cfgname LIMIT 1),
+        'simple'::regconfig
+    ))
+    FROM unnest(ARRAY['polish', 'ukrainian', 'english']) AS l(cfgname)
+$$;
+
+CREATE OR REPLACE FUNCTION core_goods_search_vector() RETURNS trigger LANGUAGE plpgsql AS $$
+DECLARE
+    config regconfig;
+BEGIN
+    NEW.search_vector := ''::tsvector;
+    FOREACH config IN ARRAY core_search_configs() LOOP
+        NEW.search_vector := NEW.search_vector
+            || setweight(to_tsvector(config, coalesce(NEW.name, '')), 'A')
+            || setweight(to_tsvector(config, coalesce(NEW.description, '')), 'B');
+    END LOOP;
+    RETURN NEW;
+END
+$$;
+
+CREATE TRIGGER core_goods_search_vector BEFORE INSERT OR UPDATE OF name, description ON core_goods
+    FOR EACH ROW EXECUTE PROCEDURE core_goods_search_vector();
+
+UPDATE core_goods SET name = name;
+
+CREATE INDEX goods_search_vector_idx ON core_goods USING gin (search_vector);
+"""
+
+DROP_SQL = """
+DROP INDEX IF EXISTS goods_search_vector_idx;
+DROP TRIGGER IF EXISTS core_goods_search_vector ON core_goods;
+DROP FUNCTION IF EXISTS core_goods_search_vector();
+DROP FUNCTION IF EXISTS core_search_configs();
+"""
+
+
+def create_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(CREATE_SQL)
+
+
+def drop_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(DROP_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='goods',
+            name='search_vector',
+            field=SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_trigger, drop_trigger),
+    ]
@@ -0,0 +1,38 @@
+from django.db import migrations
+
+# Admin autocomplete searches with icontains, which Postgres runs as
+# UPPER(column::text) LIKE UPPER('%term%'), so the trigram indexes are on that
+# expression. pg_trgm ships with Postgres, creating it needs the CREATE privilege.
+INDEXES = {
+    "goods_name_trgm_idx": ("core_goods", "name"),
+    "user_username_trgm_idx": ("core_user", "username"),
+    "user_first_name_trgm_idx": ("core_user", "first_name"),
+    "user_last_name_trgm_idx": ("core_user", "last_name"),
+    "user_email_trgm_idx": ("core_user", "email"),
+}
+
+
+def create_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for name, (table, column) in INDEXES.items():
+        schema_editor.execute(f'CREATE INDEX {name} ON {table} USING gin ((UPPER("{column}"::text)) gin_trgm_ops)')
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name in INDEXES:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_goods_search_vector'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
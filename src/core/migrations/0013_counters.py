@@ -0,0 +1,44 @@
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count(model, owner_field, statuses):
+    counted = (
+        model.objects.filter(**{owner_field: OuterRef("pk"), "status__in": statuses})
+        .order_by()
+        .values(owner_field)
+        .annotate(count=Count("pk"))
+        .values("count")
+    )
+    return Coalesce(Subquery(counted), 0)
+
+
+def fill_counters(apps, schema_editor):
+    Needs = apps.get_model("core", "Needs")
+    Poi = apps.get_model("core", "Poi")
+    Shipments = apps.get_model("core", "Shipments")
+    User = apps.get_model("core", "User")
+    Poi.objects.update(active_needs=count(Needs, "poi_id", ["active"]))
+    User.objects.update(open_shipments=count(Shipments, "created_by_id", ["to do", "in progress"]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='poi',
+            name='active_needs',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Poi.active_needs'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='open_shipments',
+            field=models.IntegerField(default=0, editable=False, verbose_name='User.open_shipments'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,56 @@
+from django.db import migrations, models
+from django.db.models import Count, Sum
+import django.db.models.deletion
+
+
+def fill_totals(apps, schema_editor):
+    Needs = apps.get_model("core", "Needs")
+    NeedsTotal = apps.get_model("core", "NeedsTotal")
+    totals = {}
+    active = (
+        Needs.objects.filter(status="active")
+        .values_list("poi_id", "good__name", "unit")
+        .annotate(quantity=Sum("quantity"), needs=Count("id"))
+        .order_by("poi_id", "good__name")
+    )
+    for poi_id, name, unit, quantity, needs in active:
+        key = (poi_id, " ".join(name.split()).casefold(), unit)
+        if key in totals:
+            totals[key].quantity += quantity
+            totals[key].needs += needs
+        else:
+            totals[key] = NeedsTotal(
+                poi_id=poi_id, name=key[1], label=name, unit=unit, quantity=quantity, needs=needs
+            )
+    NeedsTotal.objects.bulk_create(totals.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NeedsTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.TextField(verbose_name='NeedsTotal.name')),
+                ('label', models.TextField(verbose_name='Goods.name')),
+                ('unit', models.CharField(choices=[('kg', 'Needs.Units.kg'), ('l', 'Needs.Units.l'), ('pcs', 'Needs.Units.pcs')], max_length=16, verbose_name='Needs.unit')),
+                ('quantity', models.DecimalField(decimal_places=2, max_digits=14, verbose_name='Needs.quantity')),
+                ('needs', models.IntegerField(verbose_name='NeedsTotal.needs')),
+                ('poi', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.poi', verbose_name='Needs.poi')),
+            ],
+            options={
+                'verbose_name': 'NeedsTotal',
+                'verbose_name_plural': 'NeedsTotals',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='needstotal',
+            constraint=models.UniqueConstraint(fields=('name', 'unit', 'poi'), name='needs_total_unique'),
+        ),
+        migrations.RunPython(fill_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,15 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_needstotal'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='needs',
+            index=models.Index(condition=models.Q(('status', 'active')), fields=['due_time'], name='needs_active_due_idx'),
+        ),
+    ]
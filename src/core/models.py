@@ -1,6 +1,7 @@
 from django.conf import settings
 from django.contrib.auth.base_user import BaseUserManager
 from django.contrib.auth.models import AbstractUser, Group
+from django.contrib.postgres.search import SearchVectorField
 from django.core.exceptions import ValidationError
 from django.db import models
 from django.urls import reverse
@@ -58,6 +59,8 @@ class UserManager(BaseUserManager):
 class User(AbstractUser):
     description = models.TextField(_("User.description"), blank=True)
     contact = models.TextField(_("User.contact"))
+    # Shipments to do or in progress, maintained by core.counters
+    open_shipments = models.IntegerField(_("User.open_shipments"), default=0, editable=False)
 
     objects = UserManager()
 
@@ -88,6 +91,8 @@ class Poi(BaseModel):
         through="PoiMembership",
         through_fields=("poi", "member"),
     )
+    # Maintained by core.counters
+    active_needs = models.IntegerField(_("Poi.active_needs"), default=0, editable=False)
 
     class Meta:
         verbose_name = _("Poi")
@@ -116,11 +121,18 @@ class PoiMembership(BaseModel):
         return f"{self.poi.name}: {self.member.first_name} {self.member.last_name} ({self.group.name})"
 
 
+def normalize_name(name: str) -> str:
+    """Name of a good as compared across POIs and imports: case and runs of whitespace do not matter."""
+    return " ".join(name.split()).casefold()
+
+
 class Goods(BaseModel):
     name = models.TextField(_("Goods.name"))
     description = models.TextField(_("Goods.description"), blank=True)
     link = models.TextField(_("Goods.link"), blank=True)
     poi = models.ForeignKey(Poi, on_delete=models.PROTECT, verbose_name=_("Poi.name"))
+    # Filled by a database trigger and GIN indexed on Postgres, see core.search
+    search_vector = SearchVectorField(null=True, editable=False)
 
     class Meta:
         verbose_name = _("Good")
@@ -151,6 +163,18 @@ class Needs(BaseModel):
     class Meta:
         verbose_name = _("Need")
         verbose_name_plural = _("Needs")
+        indexes = [
+            # Public feed: active needs, newest first, keyset paginated on (created_at, id)
+            models.Index(
+                fields=["-created_at", "-id"],
+                condition=models.Q(status="active"),
+                name="needs_active_feed_idx",
+            ),
+            # Needs of one POI in a given status
+            models.Index(fields=["poi", "status"], name="needs_poi_status_idx"),
+            # Overdue active needs, disabled by core.expiry
+            models.Index(fields=["due_time"], condition=models.Q(status="active"), name="needs_active_due_idx"),
+        ]
 
     def __str__(self):
         return (
@@ -166,7 +190,10 @@ class Needs(BaseModel):
 
     def save(self, *args, **kwargs):
         if self.status == Needs.Status.FULFILLED:
-            self.shipments_set.update(status=Shipments.Status.DONE)
+            # core.counters imports the models
+            from core.counters import update_status
+
+            update_status(self.shipments_set.all(), Shipments.Status.DONE)
         return super().save(*args, **kwargs)
 
 
@@ -186,18 +213,38 @@ class Shipments(BaseModel):
         return super().save(*args, **kwargs)
 
     def clean(self):
-        if (
-            Shipments.objects.filter(
-                status__in=(Shipments.Status.TO_DO, Shipments.Status.IN_PROGRESS),
-                created_by=self.created_by,
-            ).count()
-            >= settings.SHIPMENTS_IN_PROGRESS_LIMIT
-        ):
+        open_shipments = User.objects.filter(pk=self.created_by_id).values_list("open_shipments", flat=True).first()
+        if (open_shipments or 0) >= settings.SHIPMENTS_IN_PROGRESS_LIMIT:
             raise ValidationError(_("Too many shipments for one user"))
 
     class Meta:
         verbose_name = _("Shipment")
         verbose_name_plural = _("Shipments")
+        indexes = [
+            # Open shipments of one user, counted on every claim
+            models.Index(fields=["created_by", "status"], name="shipments_user_status_idx"),
+        ]
 
     def __str__(self):
         return f"{self.need} - {self.status}"
+
+
+class NeedsTotal(models.Model):
+    """Quantity of active needs of one POI per good and unit, maintained by core.totals."""
+
+    poi = models.ForeignKey(Poi, on_delete=models.CASCADE, verbose_name=_("Needs.poi"))
+    # normalize_name() of the goods
+    name = models.TextField(_("NeedsTotal.name"))
+    # The name as spelled by the POI
+    label = models.TextField(_("Goods.name"))
+    unit = models.CharField(_("Needs.unit"), choices=Needs.Units.choices, max_length=16)
+    quantity = models.DecimalField(_("Needs.quantity"), max_digits=14, decimal_places=2)
+    needs = models.IntegerField(_("NeedsTotal.needs"))
+
+    class Meta:
+        verbose_name = _("NeedsTotal")
+        verbose_name_plural = _("NeedsTotals")
+        constraints = [models.UniqueConstraint(fields=["name", "unit", "poi"], name="needs_total_unique")]
+
+    def __str__(self):
+        return f"{self.poi}: {self.label} - {self.quantity}{self.get_unit_display()}"
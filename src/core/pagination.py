@@ -0,0 +1,65 @@
+import base64
+import datetime
+from typing import List, Optional, Tuple
+
+from django.db.models import Q, QuerySet
+from django.utils.functional import cached_property
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(created_at: datetime.datetime, pk: int) -> str:
+    raw = f"{created_at.isoformat()}|{pk}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime.datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, pk = raw.split("|")
+        return datetime.datetime.fromisoformat(created_at), int(pk)
+    except ValueError as e:
+        raise InvalidCursor(cursor) from e
+
+
+class KeysetPage:
+    """
+    One page of `qs` ordered newest first.
+
+    Rows are sliced on (created_at, id) instead of OFFSET, so every page costs
+    the same no matter how deep the client scrolled. The query runs on first
+    access only, so a page rendered from the template cache never touches the DB.
+    """
+
+    def __init__(self, qs: QuerySet, cursor: Optional[str], page_size: int):
+        self.cursor = cursor or ""
+        self.page_size = page_size
+        qs = qs.order_by("-created_at", "-id")
+        if cursor:
+            created_at, pk = decode_cursor(cursor)
+            qs = qs.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+        self.qs = qs
+
+    @cached_property
+    def _rows(self) -> List:
+        # One extra row tells us whether there is anything after this page
+        return list(self.qs[: self.page_size + 1])
+
+    @property
+    def object_list(self) -> List:
+        return self._rows[: self.page_size]
+
+    @property
+    def next_cursor(self) -> Optional[str]:
+        if len(self._rows) <= self.page_size:
+            return None
+        last = self.object_list[-1]
+        return encode_cursor(last.created_at, last.id)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
@@ -0,0 +1,59 @@
+import logging
+from collections import defaultdict
+from typing import Dict, FrozenSet, Iterable, List
+
+from django.core.cache import cache
+
+from core.cache import poi_permissions_version
+from core.models import Poi, PoiMembership
+
+logger = logging.getLogger(__name__)
+
+
+def poi_permissions(user) -> Dict[int, FrozenSet[str]]:
+    """
+    Returns {poi_id: permission codenames} granted to `user` by active POI memberships.
+
+    The map is built in one joined query, kept on the user object for the rest
+    of the request and in the cache across requests. The cache is invalidated
+    by core.signals whenever memberships or group permissions change.
+    is_superuser is not part of the map, it is read from the user row on every request.
+    """
+    if user.is_anonymous:
+        return {}
+
+    if not hasattr(user, "_poi_permissions"):
+        key = f"core:poi-permissions:{poi_permissions_version()}:{user.pk}"
+        permissions = cache.get(key)
+        if permissions is None:
+            rows = PoiMembership.objects.filter(
+                member=user, is_active=True, group__permissions__isnull=False
+            ).values_list("poi_id", "group__permissions__codename")
+            grouped = defaultdict(set)
+            for poi_id, codename in rows:
+                grouped[poi_id].add(codename)
+            permissions = {poi_id: frozenset(codenames) for poi_id, codenames in grouped.items()}
+            cache.set(key, permissions)
+            logger.debug("User %s has POI permissions %s", user, permissions)
+        user._poi_permissions = permissions
+    return user._poi_permissions
+
+
+def only_my_pois(user, perms: Iterable[str]) -> List[int]:
+    """Returns ids of POIs in which `user` has any of `perms`, superusers get all POIs."""
+    if user.is_anonymous:
+        return []
+
+    if user.is_superuser:
+        if not hasattr(user, "_all_pois"):
+            user._all_pois = list(Poi.objects.values_list("id", flat=True))
+        return user._all_pois
+
+    perms = set(perms)
+    return [poi_id for poi_id, codenames in poi_permissions(user).items() if codenames & perms]
+
+
+def has_poi_permissions(user, perms: Iterable[str]) -> bool:
+    """Tells whether `user` has all of `perms` in at least one POI."""
+    perms = set(perms)
+    return any(perms <= codenames for codenames in poi_permissions(user).values())
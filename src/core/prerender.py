@@ -0,0 +1,103 @@
+"""
+Pre-rendering of POI share images.
+
+Changes of a POI are debounced per POI for FB_SHARER_IMG_PRERENDER_DELAY
+seconds, then the text of its image is built here and rendered in a pool of
+FB_SHARER_IMG_PRERENDER_WORKERS processes into the "images" cache, where
+poi_needs_fb_sharer_img finds it. Rendering is CPU bound, so processes keep it
+off the GIL of the web workers. A missed or failed pre-render only means the
+view renders the image on request, as without the pool.
+"""
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional
+
+import django
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from core.img import render_png
+from core.models import Needs, Poi
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_timers: Dict[int, threading.Timer] = {}
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def poi_needs_text(poi: Poi) -> str:
+    """
+    Text of the share image of `poi`.
+
+    It is stamped with the last change of the POI or its needs instead of the
+    current time, so it changes only with the data and the image can be
+    rendered ahead and cached under the hash of its text.
+    """
+    goods_names = (
+        Needs.objects.filter(poi=poi, status=Needs.Status.ACTIVE).order_by("id").values_list("good__name", flat=True)
+    )
+    # Needs leaving the active set get a new updated_at too, so all statuses count
+    changed_at = Needs.objects.filter(poi=poi).aggregate(changed_at=Max("updated_at"))["changed_at"]
+    changed_at = timezone.localtime(max(filter(None, (changed_at, poi.updated_at))))
+    text = f"{poi.name} {changed_at.strftime('%Y-%m-%d %H:%M')} potrzebujemy:\n\n"
+    text += "\n".join(["- " + name for name in goods_names])
+    text += "\n"
+    return text
+
+
+def create_executor(workers: int) -> ProcessPoolExecutor:
+    # Forking a process with running threads and open connections is unsafe, workers start fresh.
+    # The initializer is unpickled before Django is set up in the worker, so it cannot live in core.
+    return ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"), initializer=django.setup)
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = create_executor(settings.FB_SHARER_IMG_PRERENDER_WORKERS)
+        return _executor
+
+
+def _log_failure(future):
+    if future.exception() is not None:
+        logger.error("Pre-rendering of a share image failed", exc_info=future.exception())
+
+
+def _prerender(poi_id: int) -> None:
+    with _lock:
+        _timers.pop(poi_id, None)
+    try:
+        poi = Poi.objects.filter(pk=poi_id).first()
+        if poi is not None:
+            _get_executor().submit(render_png, poi_needs_text(poi)).add_done_callback(_log_failure)
+    except Exception:
+        logger.exception("Pre-rendering of the share image of POI %s failed", poi_id)
+    finally:
+        # Timer threads are not request threads, nothing else closes their connections
+        connections.close_all()
+
+
+def schedule(poi_id: int) -> None:
+    """Pre-renders the share image of `poi_id` once its changes settle."""
+    if not settings.FB_SHARER_IMG_PRERENDER_WORKERS:
+        return
+    with _lock:
+        timer = _timers.pop(poi_id, None)
+        if timer is not None:
+            timer.cancel()
+        timer = threading.Timer(settings.FB_SHARER_IMG_PRERENDER_DELAY, _prerender, args=(poi_id,))
+        timer.daemon = True
+        _timers[poi_id] = timer
+        timer.start()
+
+
+def schedule_on_commit(poi_id: int) -> None:
+    """Like schedule(), but only after the current transaction commits, so the render sees the change."""
+    if settings.FB_SHARER_IMG_PRERENDER_WORKERS:
+        transaction.on_commit(lambda: schedule(poi_id))
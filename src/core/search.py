@@ -0,0 +1,65 @@
+"""
+Full-text search of goods and needs.
+
+Goods.search_vector is kept up to date by a trigger (migration 0011) from the
+name (weight A) and description (weight B) of a good, in every configuration
+returned by core_search_configs(): Polish, Ukrainian and English, with
+"simple" standing in for those not installed (stock Postgres has no Polish or
+Ukrainian one). Queries are parsed in the same configurations and ranked.
+
+On other databases the column stays empty and searches fall back to icontains,
+as they do on Postgres when the function is missing, e.g. in a test database
+built from the models without migrations.
+"""
+import time
+from functools import reduce
+from operator import or_
+from typing import Dict, Sequence, Tuple
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connections
+from django.db.models import F, Q, QuerySet, Value
+
+# Longer queries are truncated, nobody types them and they only cost parsing time
+QUERY_MAX_LENGTH = 200
+
+# Seconds the configurations are remembered for, a dictionary installed later is used after that
+SEARCH_CONFIGS_MAX_AGE = 300
+
+# Database alias: (time.monotonic() to expire at, configurations)
+_search_configs: Dict[str, Tuple[float, Tuple[str, ...]]] = {}
+
+
+def is_supported(using: str) -> bool:
+    return connections[using].vendor == "postgresql"
+
+
+def search_configs(using: str) -> Tuple[str, ...]:
+    """Configurations returned by core_search_configs(), none when the function is missing."""
+    now = time.monotonic()
+    expires_at, configs = _search_configs.get(using, (0.0, ()))
+    if expires_at > now:
+        return configs
+    with connections[using].cursor() as cursor:
+        cursor.execute("SELECT to_regprocedure('core_search_configs()') IS NOT NULL")
+        (installed,) = cursor.fetchone()
+        configs = ()
+        if installed:
+            cursor.execute("SELECT unnest(core_search_configs())::text")
+            configs = tuple(config for config, in cursor.fetchall())
+    _search_configs[using] = (now + SEARCH_CONFIGS_MAX_AGE, configs)
+    return configs
+
+
+def search(queryset: QuerySet, text: str, vector: str, fallback_fields: Sequence[str]) -> QuerySet:
+    """
+    Filters `queryset` to rows whose `vector` (a path to Goods.search_vector) matches `text`
+    and annotates them with `search_rank`, higher is better.
+    """
+    configs = search_configs(queryset.db) if is_supported(queryset.db) else ()
+    if not configs:
+        condition = reduce(or_, (Q(**{f"{field}__icontains": text}) for field in fallback_fields))
+        return queryset.filter(condition).annotate(search_rank=Value(0.0))
+
+    query = reduce(or_, (SearchQuery(text, config=config, search_type="websearch") for config in configs))
+    return queryset.filter(**{vector: query}).annotate(search_rank=SearchRank(F(vector), query))
@@ -0,0 +1,49 @@
+from django.conf import settings
+from django.core.exceptions import NON_FIELD_ERRORS, ValidationError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+
+from core import counters, feed, prerender, totals
+from core.cache import bump_needs_version
+from core.models import Needs, Shipments, User
+
+
+def claim_need(user, need_id: int) -> Shipments:
+    """
+    Creates a shipment of `user` for the active need `need_id` and disables the need.
+
+    Everything happens in one transaction: the user row is locked, so claims
+    of one user are serialized and SHIPMENTS_IN_PROGRESS_LIMIT cannot be
+    exceeded by parallel requests, and the need is taken with a conditional
+    UPDATE, so of two volunteers clicking the same need only one wins.
+    The loser gets a ValidationError like any other failed claim.
+    """
+    with transaction.atomic():
+        # Locks the user row and reads the counter maintained by core.counters
+        open_shipments = User.objects.select_for_update().values_list("open_shipments", flat=True).get(pk=user.pk)
+        if open_shipments >= settings.SHIPMENTS_IN_PROGRESS_LIMIT:
+            raise ValidationError({NON_FIELD_ERRORS: [_("Too many shipments for one user")]})
+
+        poi_id = Needs.objects.filter(pk=need_id).values_list("poi_id", flat=True).first()
+        if poi_id is None:
+            raise ValidationError({"need": [_("This need does not exist")]})
+        claimed = Needs.objects.filter(pk=need_id, status=Needs.Status.ACTIVE).update(
+            status=Needs.Status.DISABLED,
+            updated_at=timezone.now(),
+        )
+        if not claimed:
+            raise ValidationError({NON_FIELD_ERRORS: [_("This need has already been claimed")]})
+
+        # Checks of Shipments.save() are done above already, so the row is inserted directly
+        shipment = Shipments(need_id=need_id, status=Shipments.Status.IN_PROGRESS, created_by=user)
+        Shipments.objects.bulk_create([shipment])
+
+        # Neither update() nor bulk_create() send signals
+        counters.add_active_needs(poi_id, -1)
+        counters.add_open_shipments(user.pk, 1)
+        transaction.on_commit(bump_needs_version)
+        prerender.schedule_on_commit(poi_id)
+        totals.refresh_on_commit(poi_id)
+        feed.publish_removed("claimed", [need_id])
+    return shipment
@@ -0,0 +1,113 @@
+from typing import Set
+
+from django.conf import settings
+from django.contrib.auth.models import Group
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+
+from core import counters, feed, prerender, totals
+from core.cache import bump_needs_version, bump_poi_permissions_version
+from core.models import Goods, Needs, Poi, PoiMembership, Shipments
+
+
+def invalidate_needs_cache(sender, **kwargs):
+    bump_needs_version()
+
+
+def invalidate_poi_permissions(sender, **kwargs):
+    bump_poi_permissions_version()
+
+
+def remember_counted_owner(sender, instance, raw=False, **kwargs):
+    if not raw:
+        instance._counted_owner = counters.stored_counted_owner(instance)
+
+
+def update_counters_on_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    before, after = getattr(instance, "_counted_owner", None), counters.counted_owner(instance)
+    if before != after:
+        if before is not None:
+            counters.COUNTERS[sender].add(before, -1)
+        if after is not None:
+            counters.COUNTERS[sender].add(after, 1)
+
+
+def update_counters_on_delete(sender, instance, **kwargs):
+    owner = counters.counted_owner(instance)
+    if owner is not None:
+        counters.COUNTERS[sender].add(owner, -1)
+
+
+def publish_need(sender, instance, raw=False, **kwargs):
+    if raw or not settings.NEEDS_FEED:
+        return
+    if instance.status == Needs.Status.ACTIVE:
+        # Remembered by remember_counted_owner(), None unless the need was active before
+        was_active = getattr(instance, "_counted_owner", None) is not None
+        feed.publish(feed.need_event("changed" if was_active else "created", instance))
+    else:
+        feed.publish_removed("removed", [instance.pk])
+
+
+def publish_removed_need(sender, instance, **kwargs):
+    feed.publish_removed("removed", [instance.pk])
+
+
+def publish_good_needs(sender, instance, created=False, raw=False, **kwargs):
+    if raw or created or not settings.NEEDS_FEED:
+        return
+    for need in instance.needs_set.filter(status=Needs.Status.ACTIVE).select_related("good", "poi"):
+        feed.publish(feed.need_event("changed", need))
+
+
+def needs_poi_ids(sender, instance) -> Set[int]:
+    """POIs whose needs show `instance`, for a good also those of its needs, which may belong to another POI."""
+    poi_ids = {instance.poi_id}
+    if sender is Goods:
+        poi_ids.update(instance.needs_set.order_by().values_list("poi_id", flat=True).distinct())
+    return poi_ids
+
+
+def refresh_needs_totals(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    for poi_id in needs_poi_ids(sender, instance):
+        totals.refresh_on_commit(poi_id)
+
+
+def prerender_share_image(sender, instance, **kwargs):
+    if not settings.FB_SHARER_IMG_PRERENDER_WORKERS:
+        return
+    for poi_id in [instance.pk] if sender is Poi else needs_poi_ids(sender, instance):
+        prerender.schedule_on_commit(poi_id)
+
+
+for model in (Goods, Needs, Poi, Shipments):
+    post_save.connect(invalidate_needs_cache, sender=model, dispatch_uid=f"invalidate_needs_cache_{model.__name__}")
+    post_delete.connect(invalidate_needs_cache, sender=model, dispatch_uid=f"invalidate_needs_cache_{model.__name__}")
+
+for model in (Needs, Shipments):
+    pre_save.connect(remember_counted_owner, sender=model, dispatch_uid=f"remember_counted_owner_{model.__name__}")
+    post_save.connect(update_counters_on_save, sender=model, dispatch_uid=f"update_counters_{model.__name__}")
+    post_delete.connect(update_counters_on_delete, sender=model, dispatch_uid=f"update_counters_{model.__name__}")
+
+post_save.connect(publish_need, sender=Needs, dispatch_uid="publish_need")
+post_delete.connect(publish_removed_need, sender=Needs, dispatch_uid="publish_removed_need")
+post_save.connect(publish_good_needs, sender=Goods, dispatch_uid="publish_good_needs")
+
+# Names of goods and active needs are printed on the share image of their POI
+for model in (Goods, Needs, Poi):
+    post_save.connect(prerender_share_image, sender=model, dispatch_uid=f"prerender_share_image_{model.__name__}")
+for model in (Goods, Needs):
+    post_delete.connect(prerender_share_image, sender=model, dispatch_uid=f"prerender_share_image_{model.__name__}")
+
+for model in (Goods, Needs):
+    post_save.connect(refresh_needs_totals, sender=model, dispatch_uid=f"refresh_needs_totals_{model.__name__}")
+    post_delete.connect(refresh_needs_totals, sender=model, dispatch_uid=f"refresh_needs_totals_{model.__name__}")
+
+post_save.connect(invalidate_poi_permissions, sender=PoiMembership, dispatch_uid="invalidate_poi_permissions")
+post_delete.connect(invalidate_poi_permissions, sender=PoiMembership, dispatch_uid="invalidate_poi_permissions")
+m2m_changed.connect(
+    invalidate_poi_permissions, sender=Group.permissions.through, dispatch_uid="invalidate_poi_permissions"
+)
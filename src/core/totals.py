@@ -0,0 +1,87 @@
+"""
+Totals of active needs per good and unit, per POI and city-wide (NeedsTotal).
+
+Goods of different POIs are the same good when their names are equal after
+normalize_name(). The rows of a POI are recomputed from its active needs when
+they change, after the transaction commits; refresh() recomputes all of them,
+e.g. from a scheduled manage.py refresh_needs_totals after changes made
+directly in the database.
+"""
+from collections import defaultdict
+from decimal import Decimal
+from typing import Dict, Iterable, List, NamedTuple, Tuple
+
+from django.db import transaction
+from django.db.models import Count, Sum
+
+from core.models import Needs, NeedsTotal, Poi, normalize_name
+
+
+class Total(NamedTuple):
+    label: str
+    unit: str
+    quantity: Decimal
+    needs: int
+    # Totals of the POIs making up this one
+    pois: List[NeedsTotal]
+
+
+def refresh_poi(poi_id: int) -> None:
+    """Recomputes the totals of one POI."""
+    with transaction.atomic():
+        # Serializes refreshes of the POI, so an older computation cannot overwrite a newer one
+        if not Poi.objects.select_for_update().filter(pk=poi_id).exists():
+            return
+        totals: Dict[Tuple[str, str], NeedsTotal] = {}
+        active = (
+            Needs.objects.filter(poi_id=poi_id, status=Needs.Status.ACTIVE)
+            .values_list("good__name", "unit")
+            .annotate(quantity=Sum("quantity"), needs=Count("id"))
+            .order_by("good__name")
+        )
+        for name, unit, quantity, needs in active:
+            key = (normalize_name(name), unit)
+            if key in totals:
+                totals[key].quantity += quantity
+                totals[key].needs += needs
+            else:
+                totals[key] = NeedsTotal(
+                    poi_id=poi_id, name=key[0], label=name, unit=unit, quantity=quantity, needs=needs
+                )
+        NeedsTotal.objects.filter(poi_id=poi_id).delete()
+        NeedsTotal.objects.bulk_create(totals.values())
+
+
+def refresh_on_commit(poi_id: int) -> None:
+    transaction.on_commit(lambda: refresh_poi(poi_id))
+
+
+def refresh(poi_ids: Iterable[int] = None) -> int:
+    """Recomputes the totals of `poi_ids`, all POIs by default, and returns their number."""
+    if poi_ids is None:
+        poi_ids = Poi.objects.values_list("pk", flat=True)
+    count = 0
+    for poi_id in list(poi_ids):
+        refresh_poi(poi_id)
+        count += 1
+    return count
+
+
+def city_totals() -> List[Total]:
+    """Totals of all POIs per good and unit, by name of the good, read in one query."""
+    grouped = defaultdict(list)
+    for total in NeedsTotal.objects.select_related("poi").order_by("name", "unit", "-quantity"):
+        grouped[total.name, total.unit].append(total)
+    return sorted(
+        (
+            Total(
+                label=pois[0].label,
+                unit=unit,
+                quantity=sum(total.quantity for total in pois),
+                needs=sum(total.needs for total in pois),
+                pois=pois,
+            )
+            for (name, unit), pois in grouped.items()
+        ),
+        key=lambda total: (total.label.casefold(), total.unit),
+    )
@@ -1,27 +1,69 @@
 import datetime
+from typing import Optional, Tuple
 
+from django.conf import settings
+from django.contrib.auth.mixins import LoginRequiredMixin
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
-from django.http import HttpResponse, HttpResponseForbidden
-from django.shortcuts import render
+from django.db.models import Case, Max, OuterRef, Subquery, Value, When
+from django.http import (
+    Http404,
+    HttpResponse,
+    HttpResponseBadRequest,
+    HttpResponseForbidden,
+    JsonResponse,
+)
+from django.shortcuts import get_object_or_404, render
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, urlencode
+from django.utils.translation import get_language
+from django.utils.translation import gettext_lazy as _
 from django.views.generic import DetailView, ListView
 
-from core.img import FbSharerImg
+from core.cache import needs_version
+from core.img import render_png, text_digest
 from core.models import Needs, Poi, Shipments
+from core.pagination import InvalidCursor, KeysetPage
+from core.prerender import poi_needs_text
+from core.search import QUERY_MAX_LENGTH, search
+from core.services import claim_need
+from core.totals import city_totals
+from sfn import timing
+
+
+def parse_need_id(value: Optional[str]) -> int:
+    """The id of a need from a query parameter, ValidationError when it is missing or not a number."""
+    try:
+        need_id = int(value)
+    except (TypeError, ValueError):
+        raise ValidationError({"need": [_("Choose a need to fulfill")]})
+    if need_id < 1:
+        raise ValidationError({"need": [_("Choose a need to fulfill")]})
+    return need_id
 
 
 def need_endpoint(request):
-    context = {"needs": Needs.objects.filter(status=Needs.Status.ACTIVE).order_by("-created_at")}
+    context = {}
     if request.method == "POST":
+        if request.user.is_anonymous:
+            return HttpResponseForbidden()
         try:
-            need_id = request.GET.get("need_id")
-            Shipments.objects.create(
-                need_id=need_id,
-                status=Shipments.Status.IN_PROGRESS,
-                created_by=request.user,
-            )
+            claim_need(request.user, parse_need_id(request.GET.get("need_id")))
         except ValidationError as e:
             context["errors"] = dict(e).values()
 
+    # Read after the claim above, so the claimed need is not served from a stale fragment
+    context["cache_version"] = needs_version()
+    needs = Needs.objects.filter(status=Needs.Status.ACTIVE).select_related("good", "poi")
+    try:
+        context["needs"] = KeysetPage(needs, request.GET.get("cursor"), settings.NEEDS_PAGE_SIZE)
+    except InvalidCursor:
+        return HttpResponseBadRequest()
+    if settings.NEEDS_FEED and not context["needs"].cursor:
+        # Only the first page, new needs show up on its top
+        context["feed_url"] = settings.NEEDS_FEED_PATH
+        context["units"] = dict(Needs.Units.choices)
+
     return render(
         request=request,
         template_name="core/needs_list.html",
@@ -29,42 +71,208 @@ def need_endpoint(request):
     )
 
 
-class MyShipmentsView(ListView):
-    def get_queryset(self):
-        if self.request.user.is_anonymous:
-            raise HttpResponseForbidden
+def search_needs(request):
+    """Active needs whose goods match `q`, best matches first."""
+    text = request.GET.get("q", "").strip()[:QUERY_MAX_LENGTH]
+    needs = Needs.objects.none()
+    if text:
+        needs = search(
+            Needs.objects.filter(status=Needs.Status.ACTIVE).select_related("good", "poi"),
+            text,
+            "good__search_vector",
+            ["good__name", "good__description"],
+        ).order_by("-search_rank", "-created_at", "-id")[: settings.SEARCH_RESULTS_LIMIT]
+    return render(request, "core/needs_search.html", {"q": text, "needs": needs})
 
-        unrealized = (
-            Shipments.objects.filter(created_by=self.request.user)
-            .exclude(status=Shipments.Status.DONE)
-            .order_by("-created_at")
+
+def needs_totals(request):
+    """Quantities of all active needs per good and unit, city-wide and per POI."""
+    return render(request, "core/needs_totals.html", {"totals": city_totals()})
+
+
+def needs_api(request):
+    """Active needs as JSON, filtered by `poi`, `good` and `unit`, paginated by `cursor`."""
+    filters = {}
+    try:
+        for param in ("poi", "good"):
+            if request.GET.get(param):
+                filters[f"{param}_id"] = int(request.GET[param])
+    except ValueError:
+        return JsonResponse({"error": f"Invalid {param}"}, status=400)
+    if request.GET.get("unit"):
+        if request.GET["unit"] not in Needs.Units.values:
+            return JsonResponse({"error": "Invalid unit"}, status=400)
+        filters["unit"] = request.GET["unit"]
+    cursor = request.GET.get("cursor")
+
+    # Bumped by every change of needs, goods and POIs, so polls are answered without querying needs
+    version = needs_version()
+    etag = text_digest(f"{version}|{sorted(filters.items())}|{cursor}")
+    etag = f'"{etag}"'
+    last_modified = version // 10**9
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        needs = (
+            Needs.objects.filter(status=Needs.Status.ACTIVE, **filters)
+            .select_related("good", "poi")
+            .only("id", "created_at", "quantity", "unit", "due_time", "good__name", "poi__name")
         )
-        realized = Shipments.objects.filter(created_by=self.request.user, status=Shipments.Status.DONE).order_by(
-            "-created_at"
+        try:
+            page = KeysetPage(needs, cursor, settings.NEEDS_PAGE_SIZE)
+        except InvalidCursor:
+            return JsonResponse({"error": "Invalid cursor"}, status=400)
+
+        next_url = None
+        if page.next_cursor:
+            next_url = request.build_absolute_uri(
+                f"{request.path}?{urlencode({**request.GET.dict(), 'cursor': page.next_cursor})}"
+            )
+        response = JsonResponse(
+            {
+                "results": [
+                    {
+                        "id": need.id,
+                        "good": {"id": need.good_id, "name": need.good.name},
+                        "poi": {"id": need.poi_id, "name": need.poi.name},
+                        "quantity": need.quantity,
+                        "unit": need.unit,
+                        "due_time": need.due_time,
+                        "url": request.build_absolute_uri(need.get_absolute_url()),
+                    }
+                    for need in page
+                ],
+                "next": next_url,
+            }
+        )
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    # Clients may keep the response but have to revalidate it, which mostly ends with 304
+    patch_cache_control(response, public=True, max_age=0, must_revalidate=True)
+    return response
+
+
+class MyShipmentsView(LoginRequiredMixin, ListView):
+    model = Shipments
+
+    def get_paginate_by(self, queryset):
+        return settings.SHIPMENTS_PAGE_SIZE
+
+    def get_queryset(self):
+        # Unrealized shipments first, newest first within both groups
+        realized = Case(When(status=Shipments.Status.DONE, then=Value(1)), default=Value(0))
+        return (
+            Shipments.objects.filter(created_by=self.request.user)
+            .select_related("need__good", "need__poi")
+            .order_by(realized, "-created_at", "-id")
         )
-        return realized.union(unrealized)
 
 
-class PoiView(DetailView):
+def _max_updated_at(model, field: str, updated_at: str = "updated_at", **filters):
+    """Subquery of the latest `updated_at` of the `model` rows whose `field` is the outer row."""
+    return Subquery(
+        model.objects.filter(**{field: OuterRef("pk")}, **filters)
+        .order_by()
+        .values(field)
+        .annotate(m=Max(updated_at))
+        .values("m")
+    )
+
+
+class CachedPageMixin:
+    """
+    Conditional GET and a cache of rendered pages for anonymous visitors of a detail view,
+    mostly share crawlers and link previews. Pages of logged in users carry their name
+    and CSRF token and are rendered as usual.
+
+    Views define get_state(), returning the last modification of everything the page
+    shows and a version for changes not moving it (e.g. deleted rows), read in one
+    query, or None when the object does not exist. Both are part of the ETag and of
+    the cache key, so any change of the object or of its needs invalidates the page.
+    """
+
+    def get(self, request, *args, **kwargs):
+        if not request.user.is_anonymous:
+            return super().get(request, *args, **kwargs)
+        state = self.get_state()
+        if state is None:
+            raise Http404
+        last_modified, version = state
+        etag = text_digest(f"{type(self).__name__}|{self.kwargs['pk']}|{last_modified}|{version}|{get_language()}")
+        etag = f'"{etag}"'
+
+        response = get_conditional_response(request, etag=etag, last_modified=int(last_modified.timestamp()))
+        if response is None:
+            key = f"core:page:{request.get_host()}:{etag}"
+            content = cache.get(key)
+            if content is None:
+                response = super().get(request, *args, **kwargs).render()
+                cache.set(key, response.content, settings.PAGE_CACHE_TIMEOUT)
+            else:
+                response = HttpResponse(content)
+        response["ETag"] = etag
+        response["Last-Modified"] = http_date(last_modified.timestamp())
+        patch_cache_control(response, public=True, max_age=0, must_revalidate=True)
+        return response
+
+
+class PoiView(CachedPageMixin, DetailView):
     model = Poi
 
+    def get_state(self) -> Optional[Tuple[datetime.datetime, str]]:
+        state = (
+            Poi.objects.filter(pk=self.kwargs["pk"])
+            .annotate(
+                needs_updated_at=_max_updated_at(Needs, "poi"),
+                # Goods of the needs shown, which may belong to another POI
+                goods_updated_at=_max_updated_at(Needs, "poi", "good__updated_at", status=Needs.Status.ACTIVE),
+            )
+            .values_list("updated_at", "needs_updated_at", "goods_updated_at", "active_needs")
+            .first()
+        )
+        if state is None:
+            return None
+        return max(filter(None, state[:3])), str(state[3])
+
     def get_context_data(self, **kwargs):
-        kwargs["needs"] = kwargs["object"].needs_set.filter(status=Needs.Status.ACTIVE)
+        kwargs["needs"] = kwargs["object"].needs_set.filter(status=Needs.Status.ACTIVE).select_related("good", "poi")
+        kwargs["cache_version"] = needs_version()
         return kwargs
 
 
-class NeedView(DetailView):
+class NeedView(CachedPageMixin, DetailView):
     model = Needs
 
+    def get_state(self) -> Optional[Tuple[datetime.datetime, str]]:
+        state = (
+            Needs.objects.filter(pk=self.kwargs["pk"])
+            .values_list("updated_at", "good__updated_at", "poi__updated_at")
+            .first()
+        )
+        return state and (max(state), "")
 
-def poi_needs_fb_sharer_img(request, pk: int):
-    poi = Poi.objects.get(pk=pk)
-    needs = Needs.objects.filter(poi_id=pk, status=Needs.Status.ACTIVE)
-    text = f"{poi.name} {datetime.datetime.now().strftime('%Y-%m-%d %H:%M')} potrzebujemy:\n\n"
-    text += "\n".join(["- " + need.good.name for need in needs])
-    text += "\n"
-    fb = FbSharerImg()
-    img = fb.create(text)
-    response = HttpResponse(headers={"Content-Type": "image/png"})
-    img.save(response, "PNG")
+
+def poi_needs_img_text(pk: int) -> str:
+    return poi_needs_text(get_object_or_404(Poi, pk=pk))
+
+
+def patch_img_response(response, etag: str):
+    response["ETag"] = etag
+    patch_cache_control(response, public=True, max_age=settings.FB_SHARER_IMG_MAX_AGE)
     return response
+
+
+def timed_render_png(text: str) -> bytes:
+    # Reported as "img" for requests timed by sfn.timing, cache hits included
+    with timing.measure("img"):
+        return render_png(text)
+
+
+def poi_needs_fb_sharer_img(request, pk: int):
+    text = poi_needs_img_text(pk)
+    etag = f'"{text_digest(text)}"'
+
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(timed_render_png(text), headers={"Content-Type": "image/png"})
+    return patch_img_response(response, etag)
@@ -12,5 +12,21 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "sfn.settings")
+# Serve public pages with core.async_views, set SFN_ASYNC_VIEWS="" to keep the sync ones
+os.environ.setdefault("SFN_ASYNC_VIEWS", "1")
+# Serve the live feed of needs (core.feed), set SFN_NEEDS_FEED="" to turn it off
+os.environ.setdefault("SFN_NEEDS_FEED", "1")
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from django.conf import settings  # noqa: E402 isort:skip
+from core import expiry, feed  # noqa: E402 isort:skip
+
+expiry.start_scheduler()
+
+
+async def application(scope, receive, send):
+    # Long-lived streams bypass Django, which cannot stream from async code in 4.0
+    if scope["type"] == "http" and settings.NEEDS_FEED and scope["path"] == settings.NEEDS_FEED_PATH:
+        return await feed.app(scope, receive, send)
+    return await django_application(scope, receive, send)
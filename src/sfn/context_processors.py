@@ -4,6 +4,7 @@ from django.conf import settings as app_settings
 def settings(request):
     return {
         "DEMO": app_settings.DEMO,
+        "FRAGMENT_CACHE_TIMEOUT": app_settings.FRAGMENT_CACHE_TIMEOUT,
     }
 
 
@@ -0,0 +1,153 @@
+"""
+Read replicas and health checks of persistent database connections.
+
+With DATABASE_REPLICAS configured (SFN_DB_REPLICAS), ReplicaMiddleware lets
+anonymous GET and HEAD requests of REPLICA_ROUTES read from one healthy
+replica, picked per request. ReplicaRouter sends everything else to the
+primary: writes, reads inside a transaction, the admin, requests with a
+session, whose session and user must not lag, and requests of a browser that
+wrote within the last DATABASE_PIN_SECONDS, so users see their own changes
+despite the replication lag.
+
+Django 4.0 reuses a persistent connection (CONN_MAX_AGE) without checking it
+is still alive, so connections of the request thread, and of the pool threads
+of core.async_views, are checked before they serve a request, at most every
+DATABASE_HEALTH_CHECK_INTERVAL seconds each, and closed when broken. Replicas
+are checked in the background as often, and skipped while their last check
+failed.
+"""
+import asyncio
+import random
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, Optional, Set, Tuple
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.signals import request_started
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.urls import Resolver404, resolve
+
+# Alias of the replica serving reads of the current request, None for the primary
+_replica: ContextVar[Optional[str]] = ContextVar("replica", default=None)
+_lock = threading.Lock()
+# Replica alias -> (healthy, monotonic time of the last check)
+_replica_health: Dict[str, Tuple[bool, float]] = {}
+_probing: Set[str] = set()
+
+
+def check_connections(**kwargs) -> None:
+    """Closes broken persistent connections of this thread, Django opens new ones when needed."""
+    now = time.monotonic()
+    for connection in connections.all():
+        if connection.connection is None or connection.in_atomic_block:
+            continue
+        checked_at = getattr(connection, "health_checked_at", 0.0)
+        if now - checked_at < settings.DATABASE_HEALTH_CHECK_INTERVAL:
+            continue
+        connection.health_checked_at = now
+        if not connection.is_usable():
+            connection.close()
+
+
+def _probe(alias: str) -> None:
+    connection = connections.create_connection(alias)
+    try:
+        connection.ensure_connection()
+        healthy = connection.is_usable()
+    except DatabaseError:
+        healthy = False
+    finally:
+        connection.close()
+    with _lock:
+        _replica_health[alias] = (healthy, time.monotonic())
+        _probing.discard(alias)
+
+
+def healthy_replica() -> Optional[str]:
+    """A random replica that passed its last check. Due checks run in the background, requests never wait."""
+    now = time.monotonic()
+    healthy = []
+    with _lock:
+        for alias in settings.DATABASE_REPLICAS:
+            # Unchecked replicas are trusted until their first check ends
+            ok, checked_at = _replica_health.get(alias, (True, 0.0))
+            if now - checked_at >= settings.DATABASE_HEALTH_CHECK_INTERVAL and alias not in _probing:
+                _probing.add(alias)
+                threading.Thread(target=_probe, args=(alias,), name=f"sfn-probe-{alias}", daemon=True).start()
+            if ok:
+                healthy.append(alias)
+    return random.choice(healthy) if healthy else None
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replica = _replica.get()
+        if replica is not None and not connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return replica
+        # Explicitly, or Django would read related objects of a replica row from the replica
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        # Explicitly, or Django would save a row read from a replica back to it
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.DATABASE_REPLICAS
+
+
+class ReplicaMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(self.get_response):
+            # Same as MiddlewareMixin, marks the instance as a coroutine function for the handler
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def replica_for(self, request) -> Optional[str]:
+        if request.method not in ("GET", "HEAD"):
+            return None
+        if settings.SESSION_COOKIE_NAME in request.COOKIES or settings.DATABASE_PIN_COOKIE in request.COOKIES:
+            return None
+        try:
+            if resolve(request.path_info).url_name not in settings.REPLICA_ROUTES:
+                return None
+        except Resolver404:
+            return None
+        return healthy_replica()
+
+    def pin(self, request, response):
+        if request.method not in ("GET", "HEAD", "OPTIONS", "TRACE"):
+            response.set_cookie(
+                settings.DATABASE_PIN_COOKIE, "1", max_age=settings.DATABASE_PIN_SECONDS, httponly=True, samesite="Lax"
+            )
+        return response
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        token = _replica.set(self.replica_for(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            _replica.reset(token)
+        return self.pin(request, response)
+
+    async def __acall__(self, request):
+        token = _replica.set(self.replica_for(request))
+        try:
+            response = await self.get_response(request)
+        finally:
+            _replica.reset(token)
+        return self.pin(request, response)
+
+
+request_started.connect(check_connections, dispatch_uid="sfn_check_connections")
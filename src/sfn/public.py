@@ -0,0 +1,84 @@
+"""
+Lean path for anonymous reads of the public pages listed in PUBLIC_ROUTES.
+
+A GET or HEAD request of such a route without a session or language cookie
+cannot be personalized, so PublicRoutesMiddleware marks it as public, gives
+it an AnonymousUser and the middleware and context processors wrapped here
+skip their work: no session is loaded (so no Vary: Cookie), no user is looked
+up, no CSRF cookie is handled. Successful responses without their own
+Cache-Control get "public, max-age=0, s-maxage=PUBLIC_CACHE_MAX_AGE": a
+reverse proxy or CDN in front can serve them, but browsers revalidate, so a
+visitor who just logged in does not get their cached anonymous page.
+"""
+from django.conf import settings
+from django.contrib.auth import middleware as auth_middleware
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.messages import middleware as messages_middleware
+from django.contrib.sessions import middleware as sessions_middleware
+from django.middleware import csrf
+from django.urls import Resolver404, resolve
+from django.utils.cache import patch_cache_control
+from django.utils.deprecation import MiddlewareMixin
+from social_django import context_processors as social_context_processors
+from social_django import middleware as social_middleware
+
+
+def is_public(request) -> bool:
+    if request.method not in ("GET", "HEAD"):
+        return False
+    if settings.SESSION_COOKIE_NAME in request.COOKIES or settings.LANGUAGE_COOKIE_NAME in request.COOKIES:
+        return False
+    try:
+        return resolve(request.path_info).url_name in settings.PUBLIC_ROUTES
+    except Resolver404:
+        return False
+
+
+class PublicRoutesMiddleware(MiddlewareMixin):
+    """Marks public requests, must come before the middleware skipping them."""
+
+    def process_request(self, request):
+        request.is_public = is_public(request)
+        if request.is_public:
+            request.user = AnonymousUser()
+
+    def process_response(self, request, response):
+        if getattr(request, "is_public", False) and response.status_code == 200:
+            if not response.has_header("Cache-Control"):
+                patch_cache_control(response, public=True, max_age=0, s_maxage=settings.PUBLIC_CACHE_MAX_AGE)
+        return response
+
+
+def skipped_on_public_routes(middleware):
+    """Subclass of `middleware` passing public requests straight through."""
+
+    class Middleware(middleware):
+        def __call__(self, request):
+            if getattr(request, "is_public", False):
+                # A coroutine under ASGI, awaited by the caller like the one of MiddlewareMixin
+                return self.get_response(request)
+            return super().__call__(request)
+
+    Middleware.__name__ = Middleware.__qualname__ = middleware.__name__
+    return Middleware
+
+
+SessionMiddleware = skipped_on_public_routes(sessions_middleware.SessionMiddleware)
+# Its process_view() still runs and accepts the safe methods of public requests
+CsrfViewMiddleware = skipped_on_public_routes(csrf.CsrfViewMiddleware)
+AuthenticationMiddleware = skipped_on_public_routes(auth_middleware.AuthenticationMiddleware)
+MessageMiddleware = skipped_on_public_routes(messages_middleware.MessageMiddleware)
+SocialAuthExceptionMiddleware = skipped_on_public_routes(social_middleware.SocialAuthExceptionMiddleware)
+
+
+def social_backends(request):
+    """social_django.context_processors.backends, which looks up the user's social accounts."""
+    if getattr(request, "is_public", False):
+        return {}
+    return social_context_processors.backends(request)
+
+
+def social_login_redirect(request):
+    if getattr(request, "is_public", False):
+        return {}
+    return social_context_processors.login_redirect(request)
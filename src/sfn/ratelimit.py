@@ -0,0 +1,150 @@
+"""
+Token bucket rate limits of the routes listed in RATE_LIMITS.
+
+Every (method, URL name) limit gives each client a bucket of `burst` requests,
+refilled evenly over `seconds`. Clients are told apart by IP address only:
+cookies are chosen by the client and cannot be verified without a query, so
+keying by them would give a bot sending made up ones a new bucket every time.
+
+RateLimitMiddleware runs early in the stack and answers a client with an empty
+bucket with a bare 429 and Retry-After, before any session, user or database
+work and before the view, e.g. before Pillow renders a share image.
+
+Buckets live in RATE_LIMIT_BACKEND. MemoryBackend, the default, keeps them
+in each process, so with several workers a client may get up to `burst` per
+worker. CacheBackend shares counts between workers through the atomic add()
+and incr() of the RATE_LIMIT_CACHE cache, which must be memcached or Redis;
+it counts requests in fixed windows of `seconds` instead of a bucket, so a
+client may get up to twice `burst` across the end of a window.
+"""
+import asyncio
+import collections
+import hashlib
+import math
+import threading
+import time
+from typing import Optional, Tuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse
+from django.urls import Resolver404, resolve
+from django.utils.module_loading import import_string
+
+# (tokens left, time.time() they were counted at)
+Bucket = Tuple[float, float]
+
+
+def take(bucket: Optional[Bucket], burst: int, seconds: int, now: float) -> Tuple[Bucket, float]:
+    """Takes a token from `bucket`, None for a full one. Returns the new bucket and seconds to wait, 0 if taken."""
+    rate = burst / seconds
+    tokens, counted_at = bucket or (burst, now)
+    tokens = min(burst, tokens + max(0.0, now - counted_at) * rate)
+    if tokens >= 1:
+        return (tokens - 1, now), 0.0
+    return (tokens, now), (1 - tokens) / rate
+
+
+class MemoryBackend:
+    """Buckets of this process, least recently used ones are dropped above RATE_LIMIT_MEMORY_ENTRIES."""
+
+    blocking = False
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets: "collections.OrderedDict[str, Bucket]" = collections.OrderedDict()
+
+    def take(self, key: str, burst: int, seconds: int) -> float:
+        with self._lock:
+            bucket, wait = take(self._buckets.pop(key, None), burst, seconds, time.time())
+            self._buckets[key] = bucket
+            if len(self._buckets) > settings.RATE_LIMIT_MEMORY_ENTRIES:
+                self._buckets.popitem(last=False)
+        return wait
+
+
+class CacheBackend:
+    """Request counts per window in the RATE_LIMIT_CACHE cache, shared by the workers using it."""
+
+    blocking = True
+
+    def __init__(self):
+        self.cache = caches[settings.RATE_LIMIT_CACHE]
+
+    def take(self, key: str, burst: int, seconds: int) -> float:
+        now = time.time()
+        window = int(now // seconds)
+        # Addresses from a proxy header are not checked, hashed they are valid memcached keys
+        key = f"sfn:ratelimit:{hashlib.md5(key.encode()).hexdigest()}:{window}"
+        # Both atomic in memcached and Redis, unlike a get() and set() of a bucket
+        self.cache.add(key, 0, seconds + 1)
+        try:
+            count = self.cache.incr(key)
+        except ValueError:  # expired between add() and incr()
+            return 0.0
+        if count <= burst:
+            return 0.0
+        return (window + 1) * seconds - now
+
+
+def client_ip(request) -> str:
+    if settings.RATE_LIMIT_IP_HEADER:
+        # The last address, added by our proxy, the ones before it come from the client
+        forwarded = request.META.get(settings.RATE_LIMIT_IP_HEADER, "").rsplit(",", 1)[-1].strip()
+        if forwarded:
+            return forwarded
+    return request.META.get("REMOTE_ADDR", "")
+
+
+class RateLimitMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.RATE_LIMITS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.backend = import_string(settings.RATE_LIMIT_BACKEND)()
+        if asyncio.iscoroutinefunction(self.get_response):
+            # Same as MiddlewareMixin, marks the instance as a coroutine function for the handler
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def limit_for(self, request) -> Optional[Tuple[str, int, int]]:
+        """The bucket key, burst and seconds limiting `request`, None when its route is not limited."""
+        method = "GET" if request.method == "HEAD" else request.method
+        try:
+            url_name = resolve(request.path_info).url_name
+        except Resolver404:
+            return None
+        limit = settings.RATE_LIMITS.get((method, url_name))
+        if limit is None:
+            return None
+        return (f"sfn:ratelimit:{method}:{url_name}:{client_ip(request)}", *limit)
+
+    def too_many_requests(self, wait: float) -> HttpResponse:
+        response = HttpResponse("Too many requests\n", status=429, content_type="text/plain")
+        response["Retry-After"] = str(math.ceil(wait))
+        return response
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        limit = self.limit_for(request)
+        if limit is not None:
+            wait = self.backend.take(*limit)
+            if wait:
+                return self.too_many_requests(wait)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        limit = self.limit_for(request)
+        if limit is not None:
+            if self.backend.blocking:
+                wait = await sync_to_async(self.backend.take, thread_sensitive=False)(*limit)
+            else:
+                wait = self.backend.take(*limit)
+            if wait:
+                return self.too_many_requests(wait)
+        return await self.get_response(request)
@@ -51,15 +51,21 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "sfn.timing.ServerTimingMiddleware",
+    # Before anything touching the database
+    "sfn.ratelimit.RateLimitMiddleware",
+    # sfn.public variants of Django's middleware skip anonymous reads of PUBLIC_ROUTES
+    "sfn.public.PublicRoutesMiddleware",
+    "sfn.databases.ReplicaMiddleware",
     "django.middleware.security.SecurityMiddleware",
-    "django.contrib.sessions.middleware.SessionMiddleware",
+    "sfn.public.SessionMiddleware",
     "django.middleware.locale.LocaleMiddleware",
     "django.middleware.common.CommonMiddleware",
-    "django.middleware.csrf.CsrfViewMiddleware",
-    "django.contrib.auth.middleware.AuthenticationMiddleware",
-    "django.contrib.messages.middleware.MessageMiddleware",
+    "sfn.public.CsrfViewMiddleware",
+    "sfn.public.AuthenticationMiddleware",
+    "sfn.public.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
-    "social_django.middleware.SocialAuthExceptionMiddleware",
+    "sfn.public.SocialAuthExceptionMiddleware",
 ]
 
 ROOT_URLCONF = "sfn.urls"
@@ -75,8 +81,8 @@ TEMPLATES = [
                 "django.template.context_processors.request",
                 "django.contrib.auth.context_processors.auth",
                 "django.contrib.messages.context_processors.messages",
-                "social_django.context_processors.backends",
-                "social_django.context_processors.login_redirect",
+                "sfn.public.social_backends",
+                "sfn.public.social_login_redirect",
                 "sfn.context_processors.settings",
                 "sfn.context_processors.fb_share",
             ],
@@ -97,8 +103,44 @@ DATABASES = {
             "service": "sfn",
             "passfile": ".pgpass",
         },
+        # Seconds a connection is reused across requests, checked by sfn.databases before reuse
+        "CONN_MAX_AGE": int(os.getenv("SFN_CONN_MAX_AGE", 60)),
     }
 }
+# Read replicas, comma separated pg services, serving anonymous reads of REPLICA_ROUTES
+for i, service in enumerate(filter(None, os.getenv("SFN_DB_REPLICAS", "").split(","))):
+    DATABASES[f"replica{i}"] = {
+        "ENGINE": "django.db.backends.postgresql",
+        "OPTIONS": {
+            "service": service.strip(),
+            "passfile": ".pgpass",
+            # A replica that is down must not hang requests, they fall back to the primary
+            "connect_timeout": 2,
+        },
+        "CONN_MAX_AGE": DATABASES["default"]["CONN_MAX_AGE"],
+        "TEST": {"MIRROR": "default"},
+    }
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != "default"]
+DATABASE_ROUTERS = ["sfn.databases.ReplicaRouter"]
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.0/topics/cache/
+# File based, so all workers on the host share fragments and invalidations
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.getenv("SFN_CACHE_DIR", "/var/tmp/sfn-cache"),
+    },
+    "images": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.path.join(os.getenv("SFN_CACHE_DIR", "/var/tmp/sfn-cache"), "images"),
+        # Images are addressed by their content and never go stale, old ones are culled
+        "TIMEOUT": None,
+        "OPTIONS": {"MAX_ENTRIES": 5000},
+    },
+}
 
 
 # Password validation
@@ -160,6 +202,8 @@ AUTHENTICATION_BACKENDS = (
 
 
 SOCIAL_AUTH_LOGIN_REDIRECT_URL = "/"
+# Pages for logged in users redirect to the login page of the admin, like the "Log in" button
+LOGIN_URL = "admin:login"
 # SOCIAL_AUTH_LOGIN_URL = '/admin/'
 
 SOCIAL_AUTH_FACEBOOK_KEY = os.environ["SOCIAL_AUTH_FACEBOOK_KEY"]  # App ID
@@ -226,10 +270,108 @@ ROLLBAR = {
     "root": BASE_DIR,
 }
 
+# Server-Timing header and a timing log line for every request, see sfn.timing
+SERVER_TIMING = bool(os.getenv("SFN_SERVER_TIMING", False))
+# Requests slower than this are logged as warnings together with their slowest queries
+SERVER_TIMING_SLOW_MS = int(os.getenv("SFN_SERVER_TIMING_SLOW_MS", 500))
+SERVER_TIMING_SLOWEST_QUERIES = 5
+if SERVER_TIMING:
+    # Same as Django's, timing the templates of timed requests
+    TEMPLATES[0]["BACKEND"] = "sfn.timing.DjangoTemplates"
+
+# Async variants of the public views (core.async_views), turned on by sfn.asgi
+ASYNC_PUBLIC_VIEWS = bool(os.getenv("SFN_ASYNC_VIEWS", False))
+# Threads running ORM queries and templates of async views, per process
+ASYNC_VIEW_WORKERS = int(os.getenv("SFN_ASYNC_VIEW_WORKERS", 8))
+# Threads rendering share images for async views, per process
+IMG_RENDER_WORKERS = int(os.getenv("SFN_IMG_RENDER_WORKERS", 2))
+
+# Live feed of needs as Server-Sent Events (core.feed), served by sfn.asgi.
+# Set SFN_NEEDS_FEED on every process changing needs, e.g. WSGI ones, so they publish to it.
+NEEDS_FEED = bool(os.getenv("SFN_NEEDS_FEED", False))
+NEEDS_FEED_PATH = "/api/potrzeby/na-zywo"
+# Connected browsers per process
+NEEDS_FEED_MAX_CLIENTS = int(os.getenv("SFN_NEEDS_FEED_MAX_CLIENTS", 1000))
+# Events buffered for a slow browser before it is told to reload
+NEEDS_FEED_QUEUE_SIZE = 100
+# Seconds between keepalive comments of an idle stream and before browsers reconnect
+NEEDS_FEED_KEEPALIVE = 15
+NEEDS_FEED_RETRY = 5
+
 # Limit of shipments in ToDo/InProgress state per user
 SHIPMENTS_IN_PROGRESS_LIMIT = 20
 
+# Names of URLs served to anonymous visitors without sessions, see sfn.public
+PUBLIC_ROUTES = [
+    "needs",
+    "need",
+    "poi-detail",
+    "poi-needs-img",
+    "needs-search",
+    "needs-totals",
+    "api-needs",
+]
+# How long proxies, not browsers, may serve public pages without revalidation, unless the view says otherwise
+PUBLIC_CACHE_MAX_AGE = 60
+
+# Names of URLs whose GET requests read from DATABASE_REPLICAS, see sfn.databases
+REPLICA_ROUTES = PUBLIC_ROUTES
+# Requests of a browser within this many seconds after it wrote read from the primary
+DATABASE_PIN_COOKIE = "sfn_primary"
+DATABASE_PIN_SECONDS = 10
+# Seconds between checks of a persistent connection or replica
+DATABASE_HEALTH_CHECK_INTERVAL = 10
+
+# Token buckets per client of (method, URL name): (burst, seconds to refill it), see sfn.ratelimit
+RATE_LIMITS = {
+    # Claims of shipments
+    ("POST", "needs"): (10, 60),
+    # Rendered with Pillow on a cache miss
+    ("GET", "poi-needs-img"): (30, 60),
+}
+# sfn.ratelimit.MemoryBackend counts per process, CacheBackend shares counts between workers through
+# the RATE_LIMIT_CACHE cache, which then has to be added: memcached or Redis, for their atomic incr()
+RATE_LIMIT_BACKEND = os.getenv("SFN_RATE_LIMIT_BACKEND", "sfn.ratelimit.MemoryBackend")
+RATE_LIMIT_CACHE = "ratelimit"
+RATE_LIMIT_MEMORY_ENTRIES = 10000
+# META key of the client address set by a reverse proxy, e.g. HTTP_X_FORWARDED_FOR, REMOTE_ADDR when empty
+RATE_LIMIT_IP_HEADER = os.getenv("SFN_RATE_LIMIT_IP_HEADER", "")
+
+# Overdue needs disabled in one transaction by core.expiry
+NEEDS_EXPIRY_BATCH_SIZE = 1000
+# Seconds between expiries of overdue needs in every web process, 0 leaves it to manage.py expire_needs
+NEEDS_EXPIRY_INTERVAL = int(os.getenv("SFN_NEEDS_EXPIRY_INTERVAL", 0))
+
+# Number of needs shown on one page of the public feed
+NEEDS_PAGE_SIZE = 50
+# Shipments shown on one page of "My shipments"
+SHIPMENTS_PAGE_SIZE = 50
+# Needs shown by the public search, ranked by relevance
+SEARCH_RESULTS_LIMIT = 50
+
+# Limits of the bulk import of needs in the admin
+IMPORT_MAX_ROWS = 10000
+# Bytes of an uploaded file
+IMPORT_MAX_SIZE = 2 * 1024 * 1024
+IMPORT_BATCH_SIZE = 1000
+# Valid rows of the import preview shown on the page, invalid ones are all shown
+IMPORT_PREVIEW_ROWS = 200
+# Rows fetched at once by CSV exports in the admin
+EXPORT_CHUNK_SIZE = 2000
+
+# Lifetime of cached fragments of needs lists, they are invalidated on every change anyway
+FRAGMENT_CACHE_TIMEOUT = 60 * 60
+# Lifetime of rendered POI and need pages cached for anonymous visitors, keyed by their state anyway
+PAGE_CACHE_TIMEOUT = 60 * 60
+
 # Demo mode
 DEMO = False
 
 FONT = BASE_DIR / "fonts" / "Arial Unicode.ttf"
+
+# How long (in seconds) clients may reuse a POI share image without revalidation
+FB_SHARER_IMG_MAX_AGE = 15 * 60
+# Processes per web worker pre-rendering POI share images after their needs change, 0 renders them on request only
+FB_SHARER_IMG_PRERENDER_WORKERS = int(os.getenv("SFN_PRERENDER_WORKERS", 0))
+# Changes of one POI within this many seconds are pre-rendered once
+FB_SHARER_IMG_PRERENDER_DELAY = 5
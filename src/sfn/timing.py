@@ -0,0 +1,175 @@
+"""
+Per-request timing of SQL, template rendering and the view, reported as a Server-Timing header and a log line.
+
+Enabled by SERVER_TIMING. When disabled the middleware removes itself from the
+stack and the default template backend is used, so requests pay nothing.
+
+Queries are timed by an execute wrapper installed on the connections of the
+request thread for the duration of the request, and by record_queries() in
+the pool threads of core.async_views. Templates are timed by the DjangoTemplates
+backend of this module, configured in place of Django's when SERVER_TIMING is set.
+"""
+import asyncio
+import contextlib
+import heapq
+import json
+import logging
+import time
+from contextvars import ContextVar
+from typing import List, Optional, Tuple
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template import TemplateDoesNotExist
+from django.template.backends import django as django_backend
+
+logger = logging.getLogger(__name__)
+
+
+class RequestTiming:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.timings = {"db": 0.0, "tpl": 0.0}
+        self.queries = 0
+        # Min-heap of (duration, sql) of the slowest queries
+        self.slowest: List[Tuple[float, str]] = []
+
+    def add(self, name: str, duration: float) -> None:
+        self.timings[name] = self.timings.get(name, 0.0) + duration
+
+    def add_query(self, sql: str, duration: float) -> None:
+        self.queries += 1
+        self.add("db", duration)
+        item = (duration, sql)
+        if len(self.slowest) < settings.SERVER_TIMING_SLOWEST_QUERIES:
+            heapq.heappush(self.slowest, item)
+        elif self.slowest and item > self.slowest[0]:
+            heapq.heapreplace(self.slowest, item)
+
+
+_current: ContextVar[Optional[RequestTiming]] = ContextVar("request_timing", default=None)
+
+
+@contextlib.contextmanager
+def measure(name: str):
+    """Adds the time spent in the block to metric `name` of the current request, if it is being timed."""
+    timing = _current.get()
+    if timing is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timing.add(name, time.perf_counter() - start)
+
+
+def _record_query(execute, sql, params, many, context):
+    timing = _current.get()
+    if timing is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timing.add_query(sql, time.perf_counter() - start)
+
+
+@contextlib.contextmanager
+def record_queries():
+    """Times the queries of this thread within the block, if the current request is being timed."""
+    if _current.get() is None:
+        yield
+        return
+    with contextlib.ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(_record_query))
+        yield
+
+
+class Template(django_backend.Template):
+    def render(self, context=None, request=None):
+        timing = _current.get()
+        if timing is None:
+            return super().render(context, request)
+        # Lazy querysets are evaluated while rendering, their time is already counted as db
+        start, db_start = time.perf_counter(), timing.timings["db"]
+        try:
+            return super().render(context, request)
+        finally:
+            timing.add("tpl", time.perf_counter() - start - (timing.timings["db"] - db_start))
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+    """Django's template backend, timing the templates rendered for timed requests."""
+
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return Template(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            django_backend.reraise(exc, self)
+
+
+class ServerTimingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.SERVER_TIMING:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(self.get_response):
+            # Same as MiddlewareMixin, marks the instance as a coroutine function for the handler
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        timing = RequestTiming()
+        token = _current.set(timing)
+        try:
+            with record_queries():
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.report(request, response, timing)
+
+    async def __acall__(self, request):
+        timing = RequestTiming()
+        token = _current.set(timing)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.report(request, response, timing)
+
+    def report(self, request, response, timing: RequestTiming):
+        total = time.perf_counter() - timing.start
+        # Time of the view and inner middleware outside of measured parts
+        timing.timings["view"] = max(0.0, total - sum(timing.timings.values()))
+        timing.timings["total"] = total
+
+        response["Server-Timing"] = ", ".join(
+            f"{name};dur={duration * 1000:.1f}" + (f';desc="{timing.queries} queries"' if name == "db" else "")
+            for name, duration in timing.timings.items()
+        )
+
+        log = {
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "queries": timing.queries,
+            **{f"{name}_ms": round(duration * 1000, 1) for name, duration in timing.timings.items()},
+        }
+        if total * 1000 >= settings.SERVER_TIMING_SLOW_MS:
+            log["slowest_queries"] = [
+                {"ms": round(duration * 1000, 1), "sql": sql} for duration, sql in sorted(timing.slowest, reverse=True)
+            ]
+            logger.warning(json.dumps(log))
+        else:
+            logger.info(json.dumps(log))
+        return response
@@ -15,26 +15,49 @@ Including another URLconf
 """
 
 
+from django.conf import settings
 from django.contrib import admin
 from django.urls import include, path
 from django.views.generic import TemplateView
 
+from core import async_views
 from core.views import (
     MyShipmentsView,
     NeedView,
     PoiView,
     need_endpoint,
+    needs_api,
+    needs_totals,
     poi_needs_fb_sharer_img,
+    search_needs,
 )
 
+if settings.ASYNC_PUBLIC_VIEWS:
+    public_views = {
+        "need": async_views.need_view,
+        "poi-detail": async_views.poi_view,
+        "poi-needs-img": async_views.poi_needs_fb_sharer_img,
+        "needs": async_views.need_endpoint,
+    }
+else:
+    public_views = {
+        "need": NeedView.as_view(),
+        "poi-detail": PoiView.as_view(),
+        "poi-needs-img": poi_needs_fb_sharer_img,
+        "needs": need_endpoint,
+    }
+
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("oauth/", include("social_django.urls", namespace="social")),
     path("terms/", TemplateView.as_view(template_name="terms.html")),
     path("privacy/", TemplateView.as_view(template_name="privacy.html")),
     path("moje-dostawy/", MyShipmentsView.as_view(), name="my-shipments"),
-    path("potrzeba/<int:pk>", NeedView.as_view(), name="need"),
-    path("poi/<int:pk>/", PoiView.as_view(), name="poi-detail"),
-    path("poi/<int:pk>/potrzeby/img", poi_needs_fb_sharer_img, name="poi-needs-img"),
-    path("", need_endpoint, name="needs"),
+    path("potrzeba/<int:pk>", public_views["need"], name="need"),
+    path("poi/<int:pk>/", public_views["poi-detail"], name="poi-detail"),
+    path("poi/<int:pk>/potrzeby/img", public_views["poi-needs-img"], name="poi-needs-img"),
+    path("szukaj/", search_needs, name="needs-search"),
+    path("podsumowanie/", needs_totals, name="needs-totals"),
+    path("api/potrzeby/", needs_api, name="api-needs"),
+    path("", public_views["needs"], name="needs"),
 ]
@@ -14,3 +14,7 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "sfn.settings")
 
 application = get_wsgi_application()
+
+from core import expiry  # noqa: E402 isort:skip
+
+expiry.start_scheduler()
@@ -0,0 +1,54 @@
+import datetime
+
+import pytest
+from django.contrib.auth.models import Group
+from django.utils import timezone
+
+from core.models import Goods, Needs, Poi, User
+
+
+@pytest.fixture(autouse=True)
+def private_caches(settings):
+    # Neither serves nor overwrites the cache of the real site
+    settings.CACHES = {
+        alias: {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": f"test-{alias}"}
+        for alias in settings.CACHES
+    }
+    settings.FB_SHARER_IMG_PRERENDER_WORKERS = 0
+
+
+@pytest.fixture
+def regular_users(db):
+    Group.objects.get_or_create(name="Regular user")
+
+
+@pytest.fixture
+def make_user(regular_users):
+    def make_user(username="volunteer"):
+        return User.objects.create_user(username, f"{username}@example.com", "password")
+
+    return make_user
+
+
+@pytest.fixture
+def poi(make_user):
+    return Poi.objects.create(name="Hostel", description="", contact="", created_by=make_user("coordinator"))
+
+
+@pytest.fixture
+def make_need(poi):
+    good = Goods.objects.create(name="Water", poi=poi, created_by=poi.created_by)
+
+    def make_need(**fields):
+        fields = {
+            "good": good,
+            "poi": poi,
+            "quantity": 1,
+            "unit": Needs.Units.PCS,
+            "due_time": timezone.now() + datetime.timedelta(days=1),
+            "created_by": poi.created_by,
+            **fields,
+        }
+        return Needs.objects.create(**fields)
+
+    return make_need
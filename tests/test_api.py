@@ -0,0 +1,37 @@
+from core.models import Needs
+
+
+def test_needs_api(client, make_need):
+    need = make_need()
+    make_need(status=Needs.Status.DISABLED)
+
+    response = client.get("/api/potrzeby/")
+
+    assert response.status_code == 200
+    assert [result["id"] for result in response.json()["results"]] == [need.pk]
+
+
+def test_needs_api_not_modified_without_queries(client, make_need, django_assert_num_queries):
+    make_need()
+    etag = client.get("/api/potrzeby/")["ETag"]
+
+    with django_assert_num_queries(0):
+        response = client.get("/api/potrzeby/", HTTP_IF_NONE_MATCH=etag)
+
+    assert response.status_code == 304
+
+
+def test_needs_api_modified_by_changes(client, make_need):
+    need = make_need()
+    etag = client.get("/api/potrzeby/")["ETag"]
+
+    need.quantity = 2
+    need.save()
+    response = client.get("/api/potrzeby/", HTTP_IF_NONE_MATCH=etag)
+
+    assert response.status_code == 200
+    assert response["ETag"] != etag
+
+
+def test_needs_api_invalid_filter(client, db):
+    assert client.get("/api/potrzeby/?poi=abc").status_code == 400
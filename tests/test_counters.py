@@ -0,0 +1,82 @@
+from core import counters
+from core.models import Needs, Poi, Shipments, User
+
+
+def active_needs(poi):
+    return Poi.objects.get(pk=poi.pk).active_needs
+
+
+def open_shipments(user):
+    return User.objects.get(pk=user.pk).open_shipments
+
+
+def test_active_needs_follow_status(poi, make_need):
+    need = make_need()
+    make_need()
+    assert active_needs(poi) == 2
+
+    need.status = Needs.Status.DISABLED
+    need.save()
+    assert active_needs(poi) == 1
+
+    need.status = Needs.Status.ACTIVE
+    need.save()
+    assert active_needs(poi) == 2
+
+    need.delete()
+    assert active_needs(poi) == 1
+
+
+def test_inactive_need_is_not_counted(poi, make_need):
+    make_need(status=Needs.Status.DISABLED)
+    assert active_needs(poi) == 0
+
+
+def test_open_shipments_follow_status(make_user, make_need):
+    user = make_user()
+    shipment = Shipments.objects.create(need=make_need(), status=Shipments.Status.IN_PROGRESS, created_by=user)
+    assert open_shipments(user) == 1
+
+    shipment.status = Shipments.Status.DONE
+    shipment.save()
+    assert open_shipments(user) == 0
+
+
+def test_fulfilled_need_closes_its_shipments(poi, make_user, make_need):
+    user = make_user()
+    need = make_need()
+    Shipments.objects.create(need=need, status=Shipments.Status.IN_PROGRESS, created_by=user)
+    need.refresh_from_db()
+
+    need.status = Needs.Status.FULFILLED
+    need.save()
+
+    assert open_shipments(user) == 0
+    assert active_needs(poi) == 0
+
+
+def test_update_status(poi, make_need):
+    needs = [make_need() for _ in range(3)]
+    make_need(status=Needs.Status.DISABLED)
+
+    updated = counters.update_status(
+        Needs.objects.filter(pk__in=[need.pk for need in needs[:2]]), Needs.Status.DISABLED
+    )
+    assert updated == 2
+    assert active_needs(poi) == 1
+
+    counters.update_status(Needs.objects.all(), Needs.Status.ACTIVE)
+    assert active_needs(poi) == 4
+
+
+def test_repair(poi, make_user, make_need):
+    user = make_user()
+    make_need()
+    Shipments.objects.create(need=make_need(), status=Shipments.Status.IN_PROGRESS, created_by=user)
+    Poi.objects.filter(pk=poi.pk).update(active_needs=10)
+    User.objects.filter(pk=user.pk).update(open_shipments=0)
+
+    assert counters.repair() == 2
+    assert active_needs(poi) == 1
+    assert open_shipments(user) == 1
+    assert counters.repair() == 0
@@ -0,0 +1,127 @@
+import time
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.db import connections, transaction
+from django.http import HttpResponse
+
+from core.models import Needs
+from sfn import databases
+from sfn.databases import ReplicaMiddleware, ReplicaRouter
+
+PUBLIC_URL = "/"
+
+
+@pytest.fixture
+def replica(settings, monkeypatch):
+    alias = "replica0"
+    # A second connection to the test database, as TEST["MIRROR"] of the replicas in settings makes it
+    monkeypatch.setitem(
+        connections.settings, alias, {**connections["default"].settings_dict, "TEST": {"MIRROR": "default"}}
+    )
+    settings.DATABASE_REPLICAS = [alias]
+    # Checked just now, so no probe connects to it
+    monkeypatch.setitem(databases._replica_health, alias, (True, time.monotonic()))
+    yield alias
+    connections[alias].close()
+    del connections[alias]
+
+
+def read_from(request):
+    """Runs `request` through ReplicaMiddleware, returns the alias reads went to and the response."""
+    used = []
+
+    def view(request):
+        used.append(Needs.objects.all().db)
+        return HttpResponse()
+
+    response = ReplicaMiddleware(view)(request)
+    return used[0], response
+
+
+def test_public_get_reads_replica(rf, replica):
+    assert read_from(rf.get(PUBLIC_URL))[0] == replica
+
+
+def test_replica_serves_committed_rows(rf, transactional_db, make_need, replica):
+    need = make_need()
+    found = []
+
+    def view(request):
+        found.extend(Needs.objects.all())
+        return HttpResponse()
+
+    ReplicaMiddleware(view)(rf.get(PUBLIC_URL))
+
+    assert found == [need]
+    assert connections[replica].connection is not None
+
+
+def test_read_in_atomic_block_goes_to_primary(rf, transactional_db, replica):
+    used = []
+
+    def view(request):
+        with transaction.atomic():
+            used.append(Needs.objects.all().db)
+        used.append(Needs.objects.all().db)
+        return HttpResponse()
+
+    ReplicaMiddleware(view)(rf.get(PUBLIC_URL))
+
+    assert used == ["default", replica]
+
+
+def test_read_outside_request_goes_to_primary(replica):
+    assert Needs.objects.all().db == "default"
+    assert ReplicaRouter().db_for_write(Needs) == "default"
+
+
+def test_post_pins_to_primary(settings, rf, replica):
+    alias, response = read_from(rf.post(PUBLIC_URL))
+
+    assert alias == "default"
+    assert response.cookies[settings.DATABASE_PIN_COOKIE]["max-age"] == settings.DATABASE_PIN_SECONDS
+
+
+def test_pinned_request_reads_primary(settings, rf, replica):
+    request = rf.get(PUBLIC_URL)
+    request.COOKIES[settings.DATABASE_PIN_COOKIE] = "1"
+
+    alias, response = read_from(request)
+
+    assert alias == "default"
+    assert settings.DATABASE_PIN_COOKIE not in response.cookies
+
+
+def test_request_with_session_reads_primary(settings, rf, replica):
+    request = rf.get(PUBLIC_URL)
+    request.COOKIES[settings.SESSION_COOKIE_NAME] = "session"
+
+    assert read_from(request)[0] == "default"
+
+
+def test_route_not_listed_reads_primary(rf, replica):
+    assert read_from(rf.get("/admin/"))[0] == "default"
+
+
+def test_unhealthy_replica_skipped(rf, monkeypatch, replica):
+    monkeypatch.setitem(databases._replica_health, replica, (False, time.monotonic()))
+
+    assert read_from(rf.get(PUBLIC_URL))[0] == "default"
+
+
+def test_async_public_get_reads_replica(rf, replica):
+    used = []
+
+    async def view(request):
+        used.append(Needs.objects.all().db)
+        return HttpResponse()
+
+    async_to_sync(ReplicaMiddleware(view))(rf.get(PUBLIC_URL))
+
+    assert used == [replica]
+
+
+def test_replicas_are_not_migrated(replica):
+    assert not ReplicaRouter().allow_migrate(replica, "core")
+    assert ReplicaRouter().allow_migrate("default", "core")
@@ -0,0 +1,61 @@
+import datetime
+
+from django.utils import timezone
+
+from core import counters, expiry
+from core.cache import needs_version
+from core.models import Needs, NeedsTotal, Poi, Shipments, User
+
+
+def overdue():
+    return timezone.now() - datetime.timedelta(hours=1)
+
+
+def test_expire_in_batches(poi, make_need):
+    overdue_needs = [make_need(due_time=overdue()) for _ in range(5)]
+    due = make_need()
+    version = needs_version()
+
+    assert expiry.expire(batch_size=2) == expiry.Expired(needs=5, shipments=0)
+
+    assert set(Needs.objects.filter(status=Needs.Status.DISABLED)) == set(overdue_needs)
+    assert Needs.objects.get(pk=due.pk).status == Needs.Status.ACTIVE
+    assert Poi.objects.get(pk=poi.pk).active_needs == 1
+    assert counters.repair() == 0
+    assert needs_version() != version
+
+
+def test_expire_closes_open_shipments(make_user, make_need):
+    user = make_user()
+    need = make_need(due_time=overdue())
+    shipment = Shipments.objects.create(need=need, status=Shipments.Status.IN_PROGRESS, created_by=user)
+    # Saving the shipment disabled the need, reopened as a coordinator may do
+    counters.update_status(Needs.objects.filter(pk=need.pk), Needs.Status.ACTIVE)
+    done = Shipments.objects.create(need=make_need(due_time=overdue()), status=Shipments.Status.DONE, created_by=user)
+
+    # The need of the done shipment is disabled already
+    assert expiry.expire() == expiry.Expired(needs=1, shipments=1)
+
+    assert Shipments.objects.get(pk=shipment.pk).status == Shipments.Status.DONE
+    assert Shipments.objects.get(pk=done.pk).updated_at == done.updated_at
+    assert User.objects.get(pk=user.pk).open_shipments == 0
+    assert counters.repair() == 0
+
+
+def test_expire_refreshes_totals(poi, make_need):
+    make_need(due_time=overdue(), quantity=3)
+    make_need(quantity=2)
+
+    expiry.expire()
+
+    assert list(NeedsTotal.objects.filter(poi=poi).values_list("quantity", "needs")) == [(2, 1)]
+
+
+def test_expire_nothing_due(poi, make_need):
+    need = make_need()
+    version = needs_version()
+
+    assert expiry.expire() == expiry.Expired(needs=0, shipments=0)
+
+    assert Needs.objects.get(pk=need.pk).updated_at == need.updated_at
+    assert needs_version() == version
@@ -0,0 +1,23 @@
+import pytest
+
+from core.exports import csv_response
+from core.models import Goods
+
+
+@pytest.mark.parametrize("name", ["=1+2", "+1", "-1", "@SUM(A1)", "\t=1", "\r=1"])
+def test_formulas_are_escaped(rf, poi, name):
+    Goods.objects.create(name=name, poi=poi, created_by=poi.created_by)
+
+    response = csv_response(rf.get("/"), "goods", ["ID", "Name"], Goods.objects.order_by("id"), ["id", "name"])
+    content = b"".join(response.streaming_content).decode("utf-8-sig")
+
+    assert f"'{name}" in content
+
+
+def test_plain_values_are_kept(rf, poi):
+    good = Goods.objects.create(name="Water, still", poi=poi, created_by=poi.created_by)
+
+    response = csv_response(rf.get("/"), "goods", ["ID", "Name"], Goods.objects.all(), ["id", "name"])
+    content = b"".join(response.streaming_content).decode("utf-8-sig")
+
+    assert content.splitlines() == ["ID,Name", f'{good.pk},"Water, still"']
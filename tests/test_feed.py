@@ -0,0 +1,34 @@
+import pytest
+
+from core import feed
+from core.models import Needs
+
+
+@pytest.fixture
+def events(monkeypatch):
+    events = []
+    monkeypatch.setattr(feed, "publish", lambda event, using="default": events.append(event))
+    return events
+
+
+def test_need_saved_without_feed(settings, events, make_need):
+    settings.NEEDS_FEED = False
+    need = Needs.objects.get(pk=make_need().pk)
+
+    need.quantity = 2
+    need.save()
+
+    assert events == []
+    # Nothing loaded the good and the POI for an event
+    assert not Needs.good.is_cached(need) and not Needs.poi.is_cached(need)
+
+
+def test_need_saved_with_feed(settings, events, make_need):
+    settings.NEEDS_FEED = True
+    need = make_need()
+
+    need.quantity = 2
+    need.save()
+
+    assert [event["event"] for event in events] == ["created", "changed"]
+    assert events[-1]["id"] == need.pk
@@ -0,0 +1,139 @@
+import pytest
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+
+from core import counters
+from core.imports import NeedsImport, read_sheet
+from core.models import Goods, Needs, Poi
+
+IMPORT_URL = "/admin/core/needs/import/"
+
+VALID = b"""good,quantity,unit,due_time,description
+Water,10,l,2030-01-31,
+  WATER ,2.5,kg,2030-01-31 12:00,
+Blankets,3,pcs,2030-02-01,Warm ones
+"""
+
+INVALID = b"""good,quantity,unit,due_time
+Water,10,l,2030-01-31
+,-1,boxes,tomorrow
+"""
+
+
+@pytest.fixture
+def admin(regular_users, admin_user):
+    return admin_user
+
+
+@pytest.fixture
+def water(poi):
+    return Goods.objects.create(name="Water", poi=poi, created_by=poi.created_by)
+
+
+def upload(content, name="needs.csv"):
+    return SimpleUploadedFile(name, content, content_type="text/csv")
+
+
+def test_valid_rows(admin, poi, water):
+    needs_import = NeedsImport(admin, poi, read_sheet("needs.csv", VALID))
+
+    assert needs_import.is_valid
+    assert needs_import.new_goods == ["Blankets"]
+    assert needs_import.save() == 3
+
+    assert Needs.objects.filter(poi=poi, good=water).count() == 2
+    assert Goods.objects.get(poi=poi, name="Blankets").description == "Warm ones"
+    assert Poi.objects.get(pk=poi.pk).active_needs == 3
+    assert counters.repair() == 0
+
+
+def test_invalid_rows(admin, poi):
+    needs_import = NeedsImport(admin, poi, read_sheet("needs.csv", INVALID))
+
+    assert not needs_import.is_valid
+    assert [row.line for row in needs_import.rows if row.errors] == [3]
+    assert len(needs_import.rows[1].errors) == 4
+    with pytest.raises(ValidationError):
+        needs_import.save()
+    assert not Needs.objects.exists()
+
+
+def test_missing_columns():
+    with pytest.raises(ValidationError):
+        read_sheet("needs.csv", b"good,quantity\nWater,1\n")
+
+
+def test_too_many_rows(settings):
+    settings.IMPORT_MAX_ROWS = 2
+
+    with pytest.raises(ValidationError):
+        read_sheet("needs.csv", VALID)
+
+
+def test_save_rolled_back(monkeypatch, admin, poi):
+    def fail(poi_id, count):
+        raise RuntimeError
+
+    monkeypatch.setattr(counters, "add_active_needs", fail)
+    needs_import = NeedsImport(admin, poi, read_sheet("needs.csv", VALID))
+
+    with pytest.raises(RuntimeError):
+        needs_import.save()
+
+    assert not Goods.objects.exists()
+    assert not Needs.objects.exists()
+
+
+def test_import_view_invalid_rows(client, admin, poi):
+    client.force_login(admin)
+
+    response = client.post(IMPORT_URL, {"poi": poi.pk, "file": upload(INVALID), "dry_run": ""})
+
+    assert response.status_code == 200
+    assert [row.line for row in response.context["preview_rows"]] == [3, 2]
+    assert response.context["token"] is None
+    assert not Needs.objects.exists()
+
+
+def test_import_view_dry_run_and_confirm(client, admin, poi):
+    client.force_login(admin)
+
+    response = client.post(IMPORT_URL, {"poi": poi.pk, "file": upload(VALID), "dry_run": "on"})
+    token = response.context["token"]
+
+    assert token
+    assert not Needs.objects.exists()
+
+    response = client.post(IMPORT_URL, {"token": token})
+
+    assert response.status_code == 302
+    assert Needs.objects.filter(poi=poi).count() == 3
+
+    # The token is used up
+    response = client.post(IMPORT_URL, {"token": token})
+
+    assert response.status_code == 302
+    assert Needs.objects.filter(poi=poi).count() == 3
+
+
+def test_import_view_token_of_another_user(client, admin, make_user, poi):
+    client.force_login(admin)
+    token = client.post(IMPORT_URL, {"poi": poi.pk, "file": upload(VALID), "dry_run": "on"}).context["token"]
+    other = make_user("other")
+    other.is_superuser = other.is_staff = True
+    other.save()
+    client.force_login(other)
+
+    client.post(IMPORT_URL, {"token": token})
+
+    assert not Needs.objects.exists()
+
+
+def test_import_view_file_too_large(settings, client, admin, poi):
+    settings.IMPORT_MAX_SIZE = len(VALID) - 1
+    client.force_login(admin)
+
+    response = client.post(IMPORT_URL, {"poi": poi.pk, "file": upload(VALID), "dry_run": "on"})
+
+    assert response.context["form"].errors["file"]
+    assert response.context["token"] is None
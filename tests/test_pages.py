@@ -0,0 +1,26 @@
+from core.models import Goods, Poi
+
+
+def test_poi_page_not_modified(client, poi, make_need):
+    make_need()
+    etag = client.get(poi.get_absolute_url())["ETag"]
+
+    assert client.get(poi.get_absolute_url(), HTTP_IF_NONE_MATCH=etag).status_code == 304
+
+
+def test_poi_page_modified_by_good_of_another_poi(client, poi, make_need):
+    other = Poi.objects.create(name="Other", description="", contact="", created_by=poi.created_by)
+    good = Goods.objects.create(name="Blankets", poi=other, created_by=poi.created_by)
+    make_need(good=good)
+    etag = client.get(poi.get_absolute_url())["ETag"]
+
+    good.name = "Warm blankets"
+    good.save()
+    response = client.get(poi.get_absolute_url(), HTTP_IF_NONE_MATCH=etag)
+
+    assert response.status_code == 200
+    assert "Warm blankets" in response.content.decode()
+
+
+def test_poi_page_missing(client, db):
+    assert client.get("/poi/1/").status_code == 404
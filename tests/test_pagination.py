@@ -0,0 +1,65 @@
+import datetime
+
+import pytest
+from django.utils import timezone
+
+from core.models import Needs
+from core.pagination import InvalidCursor, KeysetPage, decode_cursor, encode_cursor
+
+
+def pages(qs, page_size):
+    cursor = None
+    while True:
+        page = KeysetPage(qs, cursor, page_size)
+        yield [need.pk for need in page]
+        cursor = page.next_cursor
+        if cursor is None:
+            return
+
+
+def test_cursor_round_trip():
+    created_at = timezone.now()
+    assert decode_cursor(encode_cursor(created_at, 42)) == (created_at, 42)
+
+
+@pytest.mark.parametrize("cursor", ["", "not base64!", "YWJj", encode_cursor(timezone.now(), 1)[:-3]])
+def test_invalid_cursor(cursor):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(cursor)
+
+
+def test_pages_cover_every_row_once(make_need):
+    now = timezone.now()
+    # Rows with equal created_at are told apart by id
+    needs = [make_need() for _ in range(7)]
+    Needs.objects.filter(pk__in=[need.pk for need in needs[2:5]]).update(created_at=now)
+    Needs.objects.filter(pk__in=[need.pk for need in needs[5:]]).update(created_at=now - datetime.timedelta(hours=1))
+    expected = list(Needs.objects.order_by("-created_at", "-id").values_list("pk", flat=True))
+
+    result = list(pages(Needs.objects.all(), 3))
+
+    assert [len(page) for page in result] == [3, 3, 1]
+    assert [pk for page in result for pk in page] == expected
+
+
+def test_last_full_page_has_no_next_cursor(make_need):
+    for _ in range(4):
+        make_need()
+
+    page = KeysetPage(Needs.objects.all(), None, 4)
+
+    assert len(page) == 4
+    assert page.next_cursor is None
+
+
+def test_rows_added_meanwhile_do_not_shift_pages(make_need):
+    for _ in range(4):
+        make_need()
+    first = KeysetPage(Needs.objects.all(), None, 2)
+    seen = [need.pk for need in first]
+    make_need()
+
+    second = KeysetPage(Needs.objects.all(), first.next_cursor, 2)
+
+    assert not set(seen) & {need.pk for need in second}
+    assert len(second) == 2
@@ -0,0 +1,23 @@
+from core import prerender
+from core.models import Goods, Poi
+
+
+def test_renamed_good_of_another_poi(settings, monkeypatch, django_capture_on_commit_callbacks, poi, make_need):
+    other = Poi.objects.create(name="Other", description="", contact="", created_by=poi.created_by)
+    good = Goods.objects.create(name="Blankets", poi=other, created_by=poi.created_by)
+    make_need(good=good)
+    scheduled = []
+    monkeypatch.setattr(prerender, "schedule", scheduled.append)
+    settings.FB_SHARER_IMG_PRERENDER_WORKERS = 1
+
+    with django_capture_on_commit_callbacks(execute=True):
+        good.name = "Warm blankets"
+        good.save()
+
+    assert sorted(scheduled) == sorted([poi.pk, other.pk])
+
+
+def test_poi_needs_text(poi, make_need):
+    make_need()
+
+    assert prerender.poi_needs_text(poi).endswith("potrzebujemy:\n\n- Water\n")
@@ -0,0 +1,76 @@
+import pytest
+
+from sfn import ratelimit
+
+
+def test_take_full_bucket():
+    bucket, wait = ratelimit.take(None, 3, 60, 1000.0)
+    assert bucket == (2, 1000.0)
+    assert wait == 0
+
+
+def test_take_empty_bucket():
+    bucket, wait = ratelimit.take((0.5, 1000.0), 3, 60, 1000.0)
+    assert bucket == (0.5, 1000.0)
+    # 0.5 of a token refilled at 3 per 60 seconds
+    assert wait == pytest.approx(10)
+
+
+def test_take_refills_evenly():
+    bucket, wait = ratelimit.take((0, 1000.0), 3, 60, 1020.0)
+    assert wait == 0
+    assert bucket[0] == pytest.approx(0)
+
+
+def test_take_refills_up_to_burst():
+    bucket, wait = ratelimit.take((0, 1000.0), 3, 60, 5000.0)
+    assert bucket == (2, 5000.0)
+
+
+def test_burst_then_limited():
+    bucket, now = None, 1000.0
+    waits = []
+    for _ in range(5):
+        bucket, wait = ratelimit.take(bucket, 3, 60, now)
+        waits.append(wait)
+    assert waits[:3] == [0, 0, 0]
+    assert all(wait > 0 for wait in waits[3:])
+
+
+@pytest.mark.parametrize("backend", [ratelimit.MemoryBackend, ratelimit.CacheBackend])
+def test_backend(settings, backend):
+    settings.CACHES = {"ratelimit": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+    backend = backend()
+
+    assert [backend.take("client", 2, 60) for _ in range(2)] == [0, 0]
+    assert 0 < backend.take("client", 2, 60) <= 60
+    assert backend.take("other-client", 2, 60) == 0
+
+
+def test_memory_backend_forgets_oldest(settings):
+    settings.RATE_LIMIT_MEMORY_ENTRIES = 2
+    backend = ratelimit.MemoryBackend()
+    backend.take("first", 1, 60)
+    backend.take("second", 1, 60)
+    backend.take("third", 1, 60)
+
+    assert backend.take("first", 1, 60) == 0
+    assert backend.take("third", 1, 60) > 0
+
+
+@pytest.mark.parametrize("header", ["", "HTTP_X_FORWARDED_FOR"])
+def test_claims_limited_by_ip(settings, rf, header):
+    settings.RATE_LIMITS = {("POST", "needs"): (1, 60)}
+    settings.RATE_LIMIT_IP_HEADER = header
+    middleware = ratelimit.RateLimitMiddleware(lambda request: "response")
+
+    def post(session, ip):
+        request = rf.post("/", REMOTE_ADDR="10.0.0.1", HTTP_X_FORWARDED_FOR=f"1.2.3.4, {ip}")
+        request.COOKIES[settings.SESSION_COOKIE_NAME] = session
+        return middleware(request)
+
+    assert post("a", "10.0.0.2") == "response"
+    # A new session cookie does not give a new bucket
+    assert post("b", "10.0.0.2").status_code == 429
+    if header:
+        assert post("c", "10.0.0.3") == "response"
@@ -0,0 +1,58 @@
+import pytest
+from django.db import connection
+
+from core.models import Goods, Needs
+from core.search import search_configs
+
+
+@pytest.fixture
+def needs(poi, make_need):
+    blankets = Goods.objects.create(name="Blankets", description="Warm", poi=poi, created_by=poi.created_by)
+    soap = Goods.objects.create(name="Soap", description="For blankets too", poi=poi, created_by=poi.created_by)
+    return {
+        "blankets": make_need(good=blankets),
+        "soap": make_need(good=soap),
+        "water": make_need(),
+        "disabled": make_need(good=blankets, status=Needs.Status.DISABLED),
+    }
+
+
+def test_search_page(client, needs):
+    response = client.get("/szukaj/", {"q": "blankets"})
+
+    assert response.status_code == 200
+    assert set(response.context["needs"]) == {needs["blankets"], needs["soap"]}
+
+
+def test_search_page_empty_query(client, needs):
+    response = client.get("/szukaj/", {"q": "  "})
+
+    assert response.status_code == 200
+    assert list(response.context["needs"]) == []
+
+
+def test_admin_search_ranked(regular_users, admin_client, needs):
+    response = admin_client.get("/admin/core/needs/", {"q": "blankets"})
+
+    results = list(response.context["cl"].result_list)
+    assert set(results) == {needs["blankets"], needs["soap"], needs["disabled"]}
+    # The name outweighs the description, without ranking newer needs come first
+    if connection.vendor == "postgresql" and search_configs(connection.alias):
+        assert results[-1] == needs["soap"]
+    else:
+        assert results == sorted(results, key=lambda need: need.pk, reverse=True)
+
+
+def test_admin_search_sorted_by_column(regular_users, admin_client, needs):
+    response = admin_client.get("/admin/core/needs/", {"q": "blankets", "o": "-5"})
+
+    results = list(response.context["cl"].result_list)
+    assert results == sorted(results, key=lambda need: (need.due_time, need.pk), reverse=True)
+
+
+def test_search_configs_without_migrations(db):
+    if connection.vendor != "postgresql":
+        pytest.skip("Needs Postgres")
+
+    # pytest.ini builds the schema from the models, without the function of migration 0011
+    assert search_configs(connection.alias) == ()
@@ -0,0 +1,128 @@
+import threading
+
+import pytest
+from django.core.exceptions import ValidationError
+from django.db import connection, connections
+
+from core.models import Needs, Poi, Shipments, User
+from core.services import claim_need
+from core.views import parse_need_id
+
+
+def test_claim_need(make_user, make_need):
+    user = make_user()
+    need = make_need()
+
+    shipment = claim_need(user, need.pk)
+
+    assert shipment.status == Shipments.Status.IN_PROGRESS
+    assert shipment.created_by == user
+    need.refresh_from_db()
+    assert need.status == Needs.Status.DISABLED
+    assert Poi.objects.get(pk=need.poi_id).active_needs == 0
+    assert User.objects.get(pk=user.pk).open_shipments == 1
+
+
+def test_claim_need_twice(make_user, make_need):
+    need = make_need()
+    claim_need(make_user("first"), need.pk)
+
+    with pytest.raises(ValidationError):
+        claim_need(make_user("second"), need.pk)
+
+    assert Shipments.objects.filter(need=need).count() == 1
+    assert Poi.objects.get(pk=need.poi_id).active_needs == 0
+
+
+def test_claim_need_over_limit(settings, make_user, make_need):
+    settings.SHIPMENTS_IN_PROGRESS_LIMIT = 2
+    user = make_user()
+    claim_need(user, make_need().pk)
+    claim_need(user, make_need().pk)
+    need = make_need()
+
+    with pytest.raises(ValidationError):
+        claim_need(user, need.pk)
+
+    need.refresh_from_db()
+    assert need.status == Needs.Status.ACTIVE
+    assert User.objects.get(pk=user.pk).open_shipments == 2
+
+
+def test_claim_need_unknown(make_user):
+    with pytest.raises(ValidationError):
+        claim_need(make_user(), 1)
+
+
+@pytest.mark.parametrize("value", [None, "", "abc", "1.5", "0", "-3"])
+def test_parse_need_id_invalid(value):
+    with pytest.raises(ValidationError):
+        parse_need_id(value)
+
+
+def test_need_endpoint_invalid_need_id(client, make_user):
+    client.force_login(make_user())
+
+    response = client.post("/?need_id=abc")
+
+    assert response.status_code == 200
+    assert response.context["errors"]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_claim_need_concurrently(settings, regular_users, make_user, make_need):
+    if connection.vendor != "postgresql":
+        pytest.skip("Needs row locks of Postgres")
+    settings.SHIPMENTS_IN_PROGRESS_LIMIT = 3
+    user = make_user()
+    needs = [make_need() for _ in range(10)]
+    errors = []
+    barrier = threading.Barrier(len(needs))
+
+    def claim(need):
+        barrier.wait()
+        try:
+            claim_need(user, need.pk)
+        except ValidationError as e:
+            errors.append(e)
+        finally:
+            connections.close_all()
+
+    threads = [threading.Thread(target=claim, args=(need,)) for need in needs]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(errors) == 7
+    assert Shipments.objects.filter(created_by=user).count() == 3
+    assert User.objects.get(pk=user.pk).open_shipments == 3
+
+
+@pytest.mark.django_db(transaction=True)
+def test_claim_same_need_concurrently(regular_users, make_user, make_need):
+    if connection.vendor != "postgresql":
+        pytest.skip("Needs row locks of Postgres")
+    users = [make_user(f"volunteer{i}") for i in range(5)]
+    need = make_need()
+    errors = []
+    barrier = threading.Barrier(len(users))
+
+    def claim(user):
+        barrier.wait()
+        try:
+            claim_need(user, need.pk)
+        except ValidationError as e:
+            errors.append(e)
+        finally:
+            connections.close_all()
+
+    threads = [threading.Thread(target=claim, args=(user,)) for user in users]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(errors) == 4
+    assert Shipments.objects.filter(need=need).count() == 1
+    assert Poi.objects.get(pk=need.poi_id).active_needs == 0
@@ -0,0 +1,49 @@
+from django.shortcuts import resolve_url
+
+from core.models import Shipments
+
+URL = "/moje-dostawy/"
+
+
+def test_my_shipments_order(client, make_user, make_need):
+    user = make_user()
+    other = Shipments.objects.create(need=make_need(), status=Shipments.Status.TO_DO, created_by=make_user("other"))
+    old_done, old_open, new_done, new_open = [
+        Shipments.objects.create(need=make_need(), status=status, created_by=user)
+        for status in (
+            Shipments.Status.DONE,
+            Shipments.Status.TO_DO,
+            Shipments.Status.DONE,
+            Shipments.Status.IN_PROGRESS,
+        )
+    ]
+    client.force_login(user)
+
+    response = client.get(URL)
+
+    assert response.status_code == 200
+    assert list(response.context["object_list"]) == [new_open, old_open, new_done, old_done]
+    assert other not in response.context["object_list"]
+
+
+def test_my_shipments_pages(settings, client, make_user, make_need):
+    settings.SHIPMENTS_PAGE_SIZE = 2
+    user = make_user()
+    shipments = [
+        Shipments.objects.create(need=make_need(), status=Shipments.Status.DONE, created_by=user) for _ in range(3)
+    ]
+    client.force_login(user)
+
+    first = client.get(URL).context
+    second = client.get(URL, {"page": 2}).context
+
+    assert first["is_paginated"] and first["paginator"].num_pages == 2
+    assert list(first["object_list"]) + list(second["object_list"]) == shipments[::-1]
+    assert client.get(URL, {"page": 3}).status_code == 404
+
+
+def test_my_shipments_anonymous(settings, client, db):
+    response = client.get(URL)
+
+    assert response.status_code == 302
+    assert response.url == f"{resolve_url(settings.LOGIN_URL)}?next={URL}"
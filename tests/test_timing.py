@@ -0,0 +1,44 @@
+import pytest
+from django.db import connection
+from django.test import Client
+
+
+@pytest.fixture
+def timed(settings):
+    settings.SERVER_TIMING = True
+    settings.TEMPLATES = [{**settings.TEMPLATES[0], "BACKEND": "sfn.timing.DjangoTemplates"}]
+
+
+def server_timing(response):
+    return dict(metric.split(";", 1)[0:2] for metric in response["Server-Timing"].split(", "))
+
+
+def test_server_timing(timed, make_need):
+    make_need()
+
+    response = Client().get("/podsumowanie/")
+
+    metrics = server_timing(response)
+    assert set(metrics) >= {"db", "tpl", "view", "total"}
+    assert 'desc="0 queries"' not in metrics["db"]
+
+
+def test_share_image_timing(timed, poi, make_need):
+    make_need()
+
+    response = Client().get(f"/poi/{poi.pk}/potrzeby/img")
+
+    assert "img" in server_timing(response)
+
+
+def test_query_wrapper_removed_after_request(timed, db):
+    Client().get("/podsumowanie/")
+
+    assert connection.execute_wrappers == []
+
+
+def test_not_timed(db):
+    response = Client().get("/podsumowanie/")
+
+    assert "Server-Timing" not in response
+    assert connection.execute_wrappers == []
@@ -0,0 +1,82 @@
+from core import counters, totals
+from core.models import Goods, Needs, NeedsTotal, Poi
+
+
+def totals_of(poi):
+    return {(total.name, total.unit): (total.label, total.quantity, total.needs) for total in poi.needstotal_set.all()}
+
+
+def test_renamed_good_of_another_poi(django_capture_on_commit_callbacks, poi, make_need):
+    other = Poi.objects.create(name="Other", description="", contact="", created_by=poi.created_by)
+    good = Goods.objects.create(name="Blankets", poi=other, created_by=poi.created_by)
+    with django_capture_on_commit_callbacks(execute=True):
+        make_need(good=good, quantity=3)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        good.name = "Warm blankets"
+        good.save()
+
+    assert totals_of(poi) == {("warm blankets", "pcs"): ("Warm blankets", 3, 1)}
+    assert not NeedsTotal.objects.filter(poi=other).exists()
+
+
+def test_refresh_poi_merges_names(poi, make_need):
+    water = Goods.objects.get(name="Water")
+    bottled = Goods.objects.create(name="water ", poi=poi, created_by=poi.created_by)
+    make_need(good=water, quantity=2, unit=Needs.Units.L)
+    make_need(good=bottled, quantity=3, unit=Needs.Units.L)
+    make_need(good=water, quantity=5)
+    make_need(good=water, quantity=7, status=Needs.Status.DISABLED)
+
+    totals.refresh_poi(poi.pk)
+
+    assert totals_of(poi) == {("water", "l"): ("Water", 5, 2), ("water", "pcs"): ("Water", 5, 1)}
+
+
+def test_refresh_poi_drops_totals_of_inactive_needs(poi, make_need):
+    need = make_need()
+    totals.refresh_poi(poi.pk)
+    counters.update_status(Needs.objects.filter(pk=need.pk), Needs.Status.DISABLED)
+
+    totals.refresh_poi(poi.pk)
+
+    assert totals_of(poi) == {}
+
+
+def test_refresh_all(poi, make_need):
+    other = Poi.objects.create(name="Other", description="", contact="", created_by=poi.created_by)
+    make_need()
+    make_need(poi=other, quantity=4)
+    # Changed directly in the database, no signal refreshes the totals
+    NeedsTotal.objects.all().delete()
+
+    assert totals.refresh() == 2
+
+    assert totals_of(poi) == {("water", "pcs"): ("Water", 1, 1)}
+    assert totals_of(other) == {("water", "pcs"): ("Water", 4, 1)}
+
+
+def test_refresh_missing_poi(db):
+    totals.refresh_poi(1)
+
+    assert not NeedsTotal.objects.exists()
+
+
+def test_city_totals(poi, make_need):
+    other = Poi.objects.create(name="Other", description="", contact="", created_by=poi.created_by)
+    blankets = Goods.objects.create(name="blankets", poi=other, created_by=poi.created_by)
+    make_need(quantity=2)
+    make_need(poi=other, quantity=3)
+    make_need(poi=other, good=blankets, quantity=1)
+    make_need(quantity=1, unit=Needs.Units.L)
+    totals.refresh([poi.pk, other.pk])
+
+    city = totals.city_totals()
+
+    assert [(total.label, total.unit, total.quantity, total.needs) for total in city] == [
+        ("blankets", "pcs", 1, 1),
+        ("Water", "l", 1, 1),
+        ("Water", "pcs", 5, 2),
+    ]
+    # POIs needing the most first
+    assert [total.poi for total in city[2].pois] == [other, poi]